@@ -0,0 +1,196 @@
+a = 1
+b = 2
+c = True
+s = "x"
+v0 = (a + 0) * (b - 0 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 0, a * b])
+w0 = not c and (a + b) * 0 <= b - a or a != b and not not c or v0 >= 0
+t0 = {a: b, 0: [a, b, (a + b) * 0], "k": {1, 2, 3}}
+u0 = dict(x=a + b, y=[a, b, 0], z=not c)
+def f0(p, q, r):
+	if p + q * r > 0 and not c:
+		for k in range(1, p + q * 0 - r):
+			print((k + p) * (q - r) % 1 + len([p, q, r, k]))
+	elif p == q or q != r and r < 0:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 0 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (0 + 1)
+x0 = f0(a, b + 0, a * b)
+v1 = (a + 1) * (b - 1 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 1, a * b])
+w1 = not c and (a + b) * 1 <= b - a or a != b and not not c or v1 >= 1
+t1 = {a: b, 1: [a, b, (a + b) * 1], "k": {1, 2, 3}}
+u1 = dict(x=a + b, y=[a, b, 1], z=not c)
+def f1(p, q, r):
+	if p + q * r > 1 and not c:
+		for k in range(1, p + q * 1 - r):
+			print((k + p) * (q - r) % 2 + len([p, q, r, k]))
+	elif p == q or q != r and r < 1:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 1 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (1 + 1)
+x1 = f1(a, b + 1, a * b)
+v2 = (a + 2) * (b - 2 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 2, a * b])
+w2 = not c and (a + b) * 2 <= b - a or a != b and not not c or v2 >= 2
+t2 = {a: b, 2: [a, b, (a + b) * 2], "k": {1, 2, 3}}
+u2 = dict(x=a + b, y=[a, b, 2], z=not c)
+def f2(p, q, r):
+	if p + q * r > 2 and not c:
+		for k in range(1, p + q * 2 - r):
+			print((k + p) * (q - r) % 3 + len([p, q, r, k]))
+	elif p == q or q != r and r < 2:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 2 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (2 + 1)
+x2 = f2(a, b + 2, a * b)
+v3 = (a + 3) * (b - 3 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 3, a * b])
+w3 = not c and (a + b) * 3 <= b - a or a != b and not not c or v3 >= 3
+t3 = {a: b, 3: [a, b, (a + b) * 3], "k": {1, 2, 3}}
+u3 = dict(x=a + b, y=[a, b, 3], z=not c)
+def f3(p, q, r):
+	if p + q * r > 3 and not c:
+		for k in range(1, p + q * 3 - r):
+			print((k + p) * (q - r) % 4 + len([p, q, r, k]))
+	elif p == q or q != r and r < 3:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 3 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (3 + 1)
+x3 = f3(a, b + 3, a * b)
+v4 = (a + 4) * (b - 4 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 4, a * b])
+w4 = not c and (a + b) * 4 <= b - a or a != b and not not c or v4 >= 4
+t4 = {a: b, 4: [a, b, (a + b) * 4], "k": {1, 2, 3}}
+u4 = dict(x=a + b, y=[a, b, 4], z=not c)
+def f4(p, q, r):
+	if p + q * r > 4 and not c:
+		for k in range(1, p + q * 4 - r):
+			print((k + p) * (q - r) % 5 + len([p, q, r, k]))
+	elif p == q or q != r and r < 4:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 4 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (4 + 1)
+x4 = f4(a, b + 4, a * b)
+v5 = (a + 5) * (b - 5 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 5, a * b])
+w5 = not c and (a + b) * 5 <= b - a or a != b and not not c or v5 >= 5
+t5 = {a: b, 5: [a, b, (a + b) * 5], "k": {1, 2, 3}}
+u5 = dict(x=a + b, y=[a, b, 5], z=not c)
+def f5(p, q, r):
+	if p + q * r > 5 and not c:
+		for k in range(1, p + q * 5 - r):
+			print((k + p) * (q - r) % 6 + len([p, q, r, k]))
+	elif p == q or q != r and r < 5:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 5 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (5 + 1)
+x5 = f5(a, b + 5, a * b)
+v6 = (a + 6) * (b - 6 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 6, a * b])
+w6 = not c and (a + b) * 6 <= b - a or a != b and not not c or v6 >= 6
+t6 = {a: b, 6: [a, b, (a + b) * 6], "k": {1, 2, 3}}
+u6 = dict(x=a + b, y=[a, b, 6], z=not c)
+def f6(p, q, r):
+	if p + q * r > 6 and not c:
+		for k in range(1, p + q * 6 - r):
+			print((k + p) * (q - r) % 7 + len([p, q, r, k]))
+	elif p == q or q != r and r < 6:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 6 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (6 + 1)
+x6 = f6(a, b + 6, a * b)
+v7 = (a + 7) * (b - 7 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 7, a * b])
+w7 = not c and (a + b) * 7 <= b - a or a != b and not not c or v7 >= 7
+t7 = {a: b, 7: [a, b, (a + b) * 7], "k": {1, 2, 3}}
+u7 = dict(x=a + b, y=[a, b, 7], z=not c)
+def f7(p, q, r):
+	if p + q * r > 7 and not c:
+		for k in range(1, p + q * 7 - r):
+			print((k + p) * (q - r) % 8 + len([p, q, r, k]))
+	elif p == q or q != r and r < 7:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 7 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (7 + 1)
+x7 = f7(a, b + 7, a * b)
+v8 = (a + 8) * (b - 8 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 8, a * b])
+w8 = not c and (a + b) * 8 <= b - a or a != b and not not c or v8 >= 8
+t8 = {a: b, 8: [a, b, (a + b) * 8], "k": {1, 2, 3}}
+u8 = dict(x=a + b, y=[a, b, 8], z=not c)
+def f8(p, q, r):
+	if p + q * r > 8 and not c:
+		for k in range(1, p + q * 8 - r):
+			print((k + p) * (q - r) % 9 + len([p, q, r, k]))
+	elif p == q or q != r and r < 8:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 8 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (8 + 1)
+x8 = f8(a, b + 8, a * b)
+v9 = (a + 9) * (b - 9 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 9, a * b])
+w9 = not c and (a + b) * 9 <= b - a or a != b and not not c or v9 >= 9
+t9 = {a: b, 9: [a, b, (a + b) * 9], "k": {1, 2, 3}}
+u9 = dict(x=a + b, y=[a, b, 9], z=not c)
+def f9(p, q, r):
+	if p + q * r > 9 and not c:
+		for k in range(1, p + q * 9 - r):
+			print((k + p) * (q - r) % 10 + len([p, q, r, k]))
+	elif p == q or q != r and r < 9:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 9 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (9 + 1)
+x9 = f9(a, b + 9, a * b)
+v10 = (a + 10) * (b - 10 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 10, a * b])
+w10 = not c and (a + b) * 10 <= b - a or a != b and not not c or v10 >= 10
+t10 = {a: b, 10: [a, b, (a + b) * 10], "k": {1, 2, 3}}
+u10 = dict(x=a + b, y=[a, b, 10], z=not c)
+def f10(p, q, r):
+	if p + q * r > 10 and not c:
+		for k in range(1, p + q * 10 - r):
+			print((k + p) * (q - r) % 11 + len([p, q, r, k]))
+	elif p == q or q != r and r < 10:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 10 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (10 + 1)
+x10 = f10(a, b + 10, a * b)
+v11 = (a + 11) * (b - 11 / (a + 1)) % 7 + a ** 2 ** 1 - len([a, b, 11, a * b])
+w11 = not c and (a + b) * 11 <= b - a or a != b and not not c or v11 >= 11
+t11 = {a: b, 11: [a, b, (a + b) * 11], "k": {1, 2, 3}}
+u11 = dict(x=a + b, y=[a, b, 11], z=not c)
+def f11(p, q, r):
+	if p + q * r > 11 and not c:
+		for k in range(1, p + q * 11 - r):
+			print((k + p) * (q - r) % 12 + len([p, q, r, k]))
+	elif p == q or q != r and r < 11:
+		while p < q and q < r or not c:
+			p = p + (q - r) * 11 ** 2
+	else:
+		for e in [p, q, r, p * q, q * r, r * p]:
+			print(e)
+	return (p + q) * (r - p) / (11 + 1)
+x11 = f11(a, b + 11, a * b)
@@ -0,0 +1,129 @@
+"""
+Memory used by the stages of translation on synthetic programs.
+Every phase of `lupy.translate` is traced by `tracemalloc`: peak and retained bytes, top allocating sites,
+and amount of live tokens, Earley states, chart entries and tree nodes.
+Peak memory of every phase per byte of input is compared with budgets, and the run fails if any of them is exceeded.
+Unlike time, traced memory doesn't depend on load of the machine, so budgets are the same everywhere.
+
+Usage: python -m benchmarks.memory [-sizes 20,80] [-sites <n>] [-budget <phase>=<bytes per input byte>]... [-save <json>]
+"""
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import ProgramGenerator  # noqa: E402
+from lexer import Token  # noqa: E402
+from lupy import Translator  # noqa: E402
+from parse import ChartEntry, EarleyState, SyntaxTree, TreeToken  # noqa: E402
+from profiler import PHASES, MemoryProfile  # noqa: E402
+
+TYPES = {
+	"Token": Token,
+	"EarleyState": EarleyState,
+	"ChartEntry": ChartEntry,
+	"SyntaxTree": SyntaxTree,
+	"TreeToken": TreeToken,
+}
+# peak bytes of the phase per byte of input
+BUDGETS = {
+	"lexing": 100,
+	"recognition": 2500,
+	"tree": 600,
+	"semantics": 100,
+	"optimization": 150,
+	"generation": 50,
+}
+
+
+def measure(code: str, sites=5, **arguments) -> dict:
+	"""Memory of every phase of translation of the code, and peak of the whole translation (bytes)."""
+	profile = MemoryProfile(TYPES, sites)
+	translator = Translator(**arguments)
+	profile.start()
+	try:
+		start = tracemalloc.get_traced_memory()[0]
+		translator.translate(code, profile=profile)
+		peak = max(profile.peak, tracemalloc.get_traced_memory()[1]) - start
+	finally:
+		profile.stop()
+	return {
+		"input": len(code.encode("utf-8")),
+		"peak": peak,
+		"phases": profile.memory,
+		"counters": profile.counters,
+	}
+
+
+def run(sizes: list, sites=5) -> dict:
+	"""Memory of optimized translation of synthetic programs of every size."""
+	return {str(statements): measure(ProgramGenerator(statements=statements).generate(), sites, optimize=True)
+			for statements in sizes}
+
+
+def over_budget(results: dict, budgets: dict) -> list:
+	"""Descriptions of phases which use more memory per byte of input than their budgets."""
+	found = []
+	for statements, result in results.items():
+		for name, memory in result["phases"].items():
+			budget = budgets.get(name)
+			ratio = memory["peak"] / result["input"]
+			if budget is not None and ratio > budget:
+				found.append("{} statements, {}: {:.0f} bytes per input byte, budget {}".format(
+					statements, name, ratio, budget))
+	return found
+
+
+def format_results(results: dict) -> str:
+	lines = []
+	for statements, result in results.items():
+		lines.append("{} statements, {} bytes of input, {} tokens, peak {:.1f} KiB".format(
+			statements, result["input"], result["counters"].get("tokens", 0), result["peak"] / 1024))
+		for name in PHASES:
+			if name not in result["phases"]:
+				continue
+			memory = result["phases"][name]
+			objects = ", ".join("{} {}".format(kind, count) for kind, count in memory["objects"].items() if count != 0)
+			lines.append("  {:<13} peak {:10.1f} KiB  retained {:10.1f} KiB  {:8.0f} B/input byte  {}".format(
+				name, memory["peak"] / 1024, memory["retained"] / 1024, memory["peak"] / result["input"], objects))
+			for site in memory["sites"]:
+				lines.append("    {:>10.1f} KiB {}".format(site["bytes"] / 1024, site["site"]))
+	return "\n".join(lines)
+
+
+def main():
+	args = sys.argv[1:]
+	sizes = [20, 80]
+	sites = 3
+	budgets = dict(BUDGETS)
+	path = None
+	while len(args) > 0:
+		arg = args.pop(0)
+		if arg == "-sizes" and len(args) > 0:
+			sizes = [int(size) for size in args.pop(0).split(",")]
+		elif arg == "-sites" and len(args) > 0:
+			sites = int(args.pop(0))
+		elif arg == "-budget" and len(args) > 0:
+			name, value = args.pop(0).split("=")
+			budgets[name] = float(value)
+		elif arg == "-save" and len(args) > 0:
+			path = args.pop(0)
+
+	results = run(sizes, sites)
+	print(format_results(results))
+	if path is not None:
+		with open(path, "w") as file:
+			json.dump(results, file, indent=1)
+		print("Results saved to", path)
+	found = over_budget(results, budgets)
+	for description in found:
+		print("Over budget:", description)
+	if found:
+		sys.exit(1)
+	print("All phases are within budgets")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,164 @@
+"""
+Scaling of the translation stages on synthetic programs of growing size.
+Every stage is timed on every size, its throughput (tokens per second on the biggest program) is reported
+together with empirical complexity exponent: time grows as tokens ** exponent.
+Results are compared with the stored baseline, and the run fails if throughput drops by more than
+`tolerance` or exponent grows by more than `slack`. Timings of a busy machine are noisy,
+so a failed run is worth repeating before looking for the cause.
+
+Usage: python -m benchmarks.scaling [-sizes 10,20,40,80] [-n <repeats>] [-tolerance 0.3] [-slack 0.25]
+                                    [-baseline <path>] [-save]
+"""
+import gc
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import ProgramGenerator  # noqa: E402
+from generator import Generator  # noqa: E402
+from lupy import analyzer  # noqa: E402
+from parse import EarleyParser  # noqa: E402
+from semantics import SemanticAnalyzer  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ["LexicalAnalyzer.parse", "EarleyParser.parse", "SemanticAnalyzer.check_tree", "Generator.generate"]
+
+
+def fit_exponent(sizes: list, times: list) -> float:
+	"""Slope of the least squares line through (log size, log time)."""
+	xs = [math.log(size) for size in sizes]
+	ys = [math.log(value) for value in times]
+	mean_x = sum(xs) / len(xs)
+	mean_y = sum(ys) / len(ys)
+	covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+	variance = sum((x - mean_x) ** 2 for x in xs)
+	return covariance / variance
+
+
+def sample_time(stage, repeats: int, minimum=0.02) -> float:
+	"""
+	Best time of one call of the stage. Fast stages are called several times in a row for every sample,
+	so that a sample takes at least `minimum` seconds and isn't dominated by timer and scheduler noise.
+	"""
+	start = time.perf_counter()
+	stage()
+	number = max(1, math.ceil(minimum / (time.perf_counter() - start)))
+	best = None
+	gc.collect()
+	gc.disable()
+	try:
+		for _ in range(repeats):
+			start = time.perf_counter()
+			for _ in range(number):
+				stage()
+			elapsed = (time.perf_counter() - start) / number
+			best = elapsed if best is None else min(best, elapsed)
+	finally:
+		gc.enable()
+	return best
+
+
+def measure(statements: int, repeats: int) -> tuple:
+	"""Amount of tokens of the program and the best time of every stage."""
+	code = ProgramGenerator(statements=statements).generate()
+	tokens = analyzer.parse(code)
+	tree = EarleyParser(tokens).parse()
+	stages = {
+		"LexicalAnalyzer.parse": lambda: analyzer.parse(code),
+		"EarleyParser.parse": lambda: EarleyParser(tokens).parse(),
+		"SemanticAnalyzer.check_tree": lambda: SemanticAnalyzer(tree).check_tree(),
+		"Generator.generate": lambda: Generator().generate(tree),
+	}
+	return len(tokens), {name: sample_time(stages[name], repeats) for name in STAGES}
+
+
+def run(sizes: list, repeats: int) -> dict:
+	"""Throughput and exponent of every stage."""
+	tokens = []
+	times = {name: [] for name in STAGES}
+	for statements in sizes:
+		count, stage_times = measure(statements, repeats)
+		tokens.append(count)
+		for name in STAGES:
+			times[name].append(stage_times[name])
+	return {
+		"sizes": sizes,
+		"tokens": tokens,
+		"stages": {name: {
+			"throughput": tokens[-1] / times[name][-1],
+			"exponent": fit_exponent(tokens, times[name]),
+			"times": times[name],
+		} for name in STAGES},
+	}
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, slack: float) -> list:
+	"""Descriptions of stages which are slower or scale worse than in the baseline."""
+	found = []
+	for name, result in results["stages"].items():
+		expected = baseline["stages"].get(name)
+		if expected is None:
+			continue
+		if result["throughput"] < expected["throughput"] * (1 - tolerance):
+			found.append("{}: throughput {:.0f} tokens/s, baseline {:.0f} tokens/s".format(
+				name, result["throughput"], expected["throughput"]))
+		if result["exponent"] > expected["exponent"] + slack:
+			found.append("{}: exponent {:.2f}, baseline {:.2f}".format(name, result["exponent"], expected["exponent"]))
+	return found
+
+
+def main():
+	args = sys.argv[1:]
+	sizes = [10, 20, 40, 80]
+	repeats = 5
+	tolerance = 0.3
+	slack = 0.25
+	path = BASELINE
+	save = False
+	while len(args) > 0:
+		arg = args.pop(0)
+		if arg == "-sizes" and len(args) > 0:
+			sizes = [int(size) for size in args.pop(0).split(",")]
+		elif arg == "-n" and len(args) > 0:
+			repeats = int(args.pop(0))
+		elif arg == "-tolerance" and len(args) > 0:
+			tolerance = float(args.pop(0))
+		elif arg == "-slack" and len(args) > 0:
+			slack = float(args.pop(0))
+		elif arg == "-baseline" and len(args) > 0:
+			path = args.pop(0)
+		elif arg == "-save":
+			save = True
+
+	results = run(sizes, repeats)
+	print("Tokens: {} (statements: {}, best of {})".format(results["tokens"], sizes, repeats))
+	for name in STAGES:
+		stage = results["stages"][name]
+		print("  {:<28} {:10.0f} tokens/s  exponent {:5.2f}".format(name, stage["throughput"], stage["exponent"]))
+
+	if save:
+		with open(path, "w") as file:
+			json.dump(results, file, indent=1)
+		print("Baseline saved to", path)
+		return
+	if not os.path.exists(path):
+		print("No baseline at {}, run with -save to create it".format(path))
+		return
+	with open(path, "r") as file:
+		baseline = json.load(file)
+	if baseline["sizes"] != sizes:
+		print("Baseline was measured on sizes {}, exponents may differ".format(baseline["sizes"]))
+	found = regressions(results, baseline, tolerance, slack)
+	for description in found:
+		print("Regression:", description)
+	if found:
+		sys.exit(1)
+	print("No regressions against", path)
+
+
+if __name__ == '__main__':
+	main()
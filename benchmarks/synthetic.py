@@ -0,0 +1,199 @@
+"""
+Grammar-driven generator of synthetic programs for benchmarks.
+Statements are built from the rules of `grammar/grammar.txt` (assignments, output, calls, conditions, loops
+and functions), and every identifier is assigned before it's used, so programs pass semantic checks.
+
+Usage: python -m benchmarks.synthetic [-statements <n>] [-depth <n>] [-expression <n>] [-literal <n>]
+                                      [-density <fraction>] [-seed <n>]
+"""
+import random
+import string
+import sys
+
+ARITHMETIC = ["+", "-", "*", "/", "%"]
+COMPARISONS = ["<", "<=", ">", ">=", "==", "!="]
+
+
+class Scope:
+	"""Names assigned so far, by kind of their values."""
+
+	def __init__(self, parent=None):
+		self.numbers = list(parent.numbers) if parent else []
+		self.strings = list(parent.strings) if parent else []
+		self.booleans = list(parent.booleans) if parent else []
+		self.lists = list(parent.lists) if parent else []
+
+
+class ProgramGenerator:
+	"""
+	Generates programs of `statements` top-level statements. Blocks are nested up to `depth` levels,
+	expressions have `expression` operands, literals have `literal` digits or characters,
+	and `density` is the share of operands which are identifiers rather than literals.
+	"""
+
+	def __init__(self, statements=100, depth=2, expression=4, literal=3, density=0.5, seed=0):
+		self.statements = statements
+		self.depth = depth
+		self.expression = expression
+		self.literal = literal
+		self.density = density
+		self.random = random.Random(seed)
+		self.lines = []
+		self.counter = 0
+		self.functions = []
+
+	def generate(self) -> str:
+		self.lines = []
+		self.counter = 0
+		self.functions = []
+		scope = Scope()
+		for _ in range(self.statements):
+			if self.random.random() < 0.1:
+				self.function(scope)
+			else:
+				self.sentence(scope, 0, top=True)
+		return "\n".join(self.lines) + "\n"
+
+	def name(self, prefix: str) -> str:
+		self.counter += 1
+		return "{}{}".format(prefix, self.counter)
+
+	def emit(self, level: int, text: str):
+		self.lines.append("\t" * level + text)
+
+	# <sentence>
+	def sentence(self, scope: Scope, level: int, top=False):
+		kinds = ["assignment"] * 4 + ["output"] * 2
+		if level < self.depth:
+			kinds += ["condition", "while_loop", "for_loop"]
+		if top and self.functions:
+			kinds += ["function_call"]
+		getattr(self, self.random.choice(kinds))(scope, level)
+
+	def block(self, scope: Scope, level: int):
+		inner = Scope(scope)
+		for _ in range(self.random.randint(1, 3)):
+			self.sentence(inner, level + 1)
+
+	def assignment(self, scope: Scope, level: int):
+		kind = self.random.choice(["number", "number", "string", "boolean", "list"])
+		if kind == "number":
+			value = self.mathematical(scope)
+		elif kind == "string":
+			value = self.string(scope)
+		elif kind == "boolean":
+			value = self.boolean(scope)
+		else:
+			value = self.collection(scope)
+		name = self.name(kind[0])
+		self.emit(level, "{} = {}".format(name, value))
+		getattr(scope, kind + "s" if kind != "boolean" else "booleans").append(name)
+
+	def output(self, scope: Scope, level: int):
+		value = self.random.choice([self.mathematical, self.string, self.boolean])(scope)
+		self.emit(level, "print({})".format(value))
+
+	def function_call(self, scope: Scope, level: int):
+		self.emit(level, "{} = {}".format(self.name("n"), self.call(scope)))
+		scope.numbers.append("n{}".format(self.counter))
+
+	def condition(self, scope: Scope, level: int):
+		self.emit(level, "if {}:".format(self.boolean(scope)))
+		self.block(scope, level)
+		for _ in range(self.random.randint(0, 2)):
+			self.emit(level, "elif {}:".format(self.boolean(scope)))
+			self.block(scope, level)
+		if self.random.random() < 0.5:
+			self.emit(level, "else:")
+			self.block(scope, level)
+
+	def while_loop(self, scope: Scope, level: int):
+		self.emit(level, "while {}:".format(self.boolean(scope)))
+		self.block(scope, level)
+
+	def for_loop(self, scope: Scope, level: int):
+		inner = Scope(scope)
+		variable = self.name("i")
+		inner.numbers.append(variable)
+		if scope.lists and self.random.random() < 0.3:
+			self.emit(level, "for {} in {}:".format(variable, self.random.choice(scope.lists)))
+		else:
+			self.emit(level, "for {} in range({}):".format(variable, self.mathematical(scope)))
+		for _ in range(self.random.randint(1, 3)):
+			self.sentence(inner, level + 1)
+
+	# <function>
+	def function(self, scope: Scope):
+		name = self.name("f")
+		parameters = [self.name("p") for _ in range(self.random.randint(1, 3))]
+		local = Scope()
+		local.numbers.extend(parameters)
+		self.emit(0, "def {}({}):".format(name, ", ".join(parameters)))
+		for _ in range(self.random.randint(1, 3)):
+			self.sentence(local, 1)
+		self.emit(1, "return {}".format(self.mathematical(local)))
+		self.functions.append((name, len(parameters)))
+
+	def call(self, scope: Scope) -> str:
+		name, count = self.random.choice(self.functions)
+		return "{}({})".format(name, ", ".join(self.mathematical(scope, 2) for _ in range(count)))
+
+	# expressions
+	def operand(self, names: list, literal):
+		if names and self.random.random() < self.density:
+			return self.random.choice(names)
+		return literal()
+
+	def number(self) -> str:
+		return str(self.random.randint(10 ** (self.literal - 1), 10 ** self.literal - 1))
+
+	def text(self) -> str:
+		return '"{}"'.format("".join(self.random.choice(string.ascii_letters) for _ in range(self.literal)))
+
+	def mathematical(self, scope: Scope, operands=None) -> str:
+		count = operands or self.expression
+		parts = [self.operand(scope.numbers, self.number)]
+		for _ in range(count - 1):
+			operand = self.operand(scope.numbers, self.number)
+			if scope.lists and self.random.random() < 0.1:
+				operand = "len({})".format(self.random.choice(scope.lists))
+			parts.append(self.random.choice(ARITHMETIC))
+			parts.append(operand)
+		expression = " ".join(parts)
+		if count > 2 and self.random.random() < 0.3:
+			expression = "({}) * {}".format(expression, self.operand(scope.numbers, self.number))
+		return expression
+
+	def string(self, scope: Scope) -> str:
+		return " + ".join(self.operand(scope.strings, self.text) for _ in range(max(1, self.expression // 2)))
+
+	def boolean(self, scope: Scope) -> str:
+		parts = []
+		for i in range(max(1, self.expression // 2)):
+			if i > 0:
+				parts.append(self.random.choice(["and", "or"]))
+			if scope.booleans and self.random.random() < self.density / 2:
+				parts.append(self.random.choice(scope.booleans))
+			else:
+				comparison = "{} {} {}".format(self.mathematical(scope, 2), self.random.choice(COMPARISONS),
+											   self.mathematical(scope, 2))
+				parts.append("not " + comparison if self.random.random() < 0.2 else comparison)
+		return " ".join(parts)
+
+	def collection(self, scope: Scope) -> str:
+		return "[{}]".format(", ".join(self.operand(scope.numbers, self.number) for _ in range(self.expression)))
+
+
+def main():
+	args = sys.argv[1:]
+	parameters = {}
+	types = {"statements": int, "depth": int, "expression": int, "literal": int, "density": float, "seed": int}
+	while len(args) > 1:
+		name = args.pop(0).lstrip("-")
+		if name in types:
+			parameters[name] = types[name](args.pop(0))
+	sys.stdout.write(ProgramGenerator(**parameters).generate())
+
+
+if __name__ == '__main__':
+	main()
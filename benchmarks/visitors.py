@@ -0,0 +1,57 @@
+"""
+Throughput of the tree walking stages (`SemanticAnalyzer.check_tree` and `Generator.generate`)
+on a node-dense program, in tree nodes per second.
+
+Usage: python -m benchmarks.visitors [-n <repeats>] [path]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generator import Generator  # noqa: E402
+from lupy import build_tree  # noqa: E402
+from semantics import SemanticAnalyzer  # noqa: E402
+
+DEFAULT_INPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "node_dense.py")
+
+
+def best_time(stage, repeats):
+	best = None
+	for _ in range(repeats):
+		start = time.perf_counter()
+		stage()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+
+def main():
+	args = sys.argv[1:]
+	repeats = 20
+	path = DEFAULT_INPUT
+	while len(args) > 0:
+		arg = args.pop(0)
+		if arg == "-n" and len(args) > 0:
+			repeats = int(args.pop(0))
+		else:
+			path = arg
+	
+	with open(path, "r") as file:
+		tree = build_tree(file.read(), safe=False)
+	nodes = sum(1 for _ in tree.subtrees())
+	print("Input: {} ({} nodes, best of {})".format(path, nodes, repeats))
+	
+	generator = Generator()
+	stages = [
+		("SemanticAnalyzer.check_tree", lambda: SemanticAnalyzer(tree).check_tree()),
+		("Generator.generate", lambda: generator.generate(tree)),
+	]
+	for name, stage in stages:
+		elapsed = best_time(stage, repeats)
+		print("  {:<28} {:8.2f} ms  {:10.0f} nodes/s".format(name, elapsed * 1000, nodes / elapsed))
+
+
+if __name__ == '__main__':
+	main()
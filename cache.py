@@ -0,0 +1,100 @@
+"""
+In-process cache of translations, for services which translate the same code many times.
+"""
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from errors import AnalyzerError
+
+# approximate memory of an entry besides its value: key, tuple and node of the ordered dictionary
+ENTRY_OVERHEAD = 200
+
+
+class TranslationCache:
+	"""
+	LRU cache of results of translation, bounded by approximate size of the stored results in bytes.
+	Keys are made by `key` from hash of the code and fingerprint of everything else that changes the result
+	(options of translation and grammar). Errors of translation (`AnalyzerError`) are cached as well if `errors` is set.
+	Entries older than `ttl` seconds are dropped if it's set. One cache can be shared by many threads and translators.
+	"""
+
+	def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None, errors=True, clock=time.monotonic):
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.errors = errors
+		self.clock = clock
+		self.entries = OrderedDict()
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+		self.lock = threading.Lock()
+
+	@staticmethod
+	def key(code: str, fingerprint: str) -> tuple:
+		return fingerprint, hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, key):
+		"""
+		Returns `(True, result)` if the result is cached, or `(False, None)` otherwise.
+		Cached error is returned as a result, caller decides whether to raise it.
+		"""
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None and self.ttl is not None and self.clock() - entry[2] > self.ttl:
+				self.remove(key)
+				self.expirations += 1
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return False, None
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return True, entry[0]
+
+	def put(self, key, result):
+		"""Stores Lua code or `AnalyzerError`, evicting least recently used entries to stay within `max_bytes`."""
+		if isinstance(result, AnalyzerError):
+			if not self.errors:
+				return
+			size = sys.getsizeof(str(result)) + ENTRY_OVERHEAD
+		else:
+			size = sys.getsizeof(result) + ENTRY_OVERHEAD
+		if size > self.max_bytes:
+			return
+		with self.lock:
+			if key in self.entries:
+				self.remove(key)
+			while self.size + size > self.max_bytes:
+				self.remove(next(iter(self.entries)))
+				self.evictions += 1
+			self.entries[key] = (result, size, self.clock())
+			self.size += size
+
+	def remove(self, key):
+		# lock must be held by the caller
+		_, size, _ = self.entries.pop(key)
+		self.size -= size
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.size = 0
+
+	def stats(self) -> dict:
+		with self.lock:
+			return {
+				"entries": len(self.entries),
+				"bytes": self.size,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"expirations": self.expirations,
+			}
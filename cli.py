@@ -0,0 +1,97 @@
+"""
+Command line arguments of LuPy. This module doesn't load the translator, so clients of the daemon start fast.
+"""
+
+# command line flags of generator options
+FLAGS = {
+	"-local": "local_variables",
+	"-arrays": "lua_arrays",
+	"-hoist": "hoist_invariants",
+	"-buffers": "string_buffers",
+	"-compact": "compact",
+	"-map": "source_map",
+}
+
+
+def parse_arguments(args):
+	"""
+	Parses command line arguments. Returns None if help has to be shown,
+	otherwise input, output, `-watch` flag and keyword arguments of `process`.
+	"""
+	args = list(args)
+	input = None
+	output = None
+	watching = False
+	settings = {"safe": True, "optimize": False, "shake": False, "exports": [], "jobs": 1, "profile": False, "pstats": 0}
+	help = len(args) > 0
+	while len(args) > 0:
+		arg = args.pop(0)
+		if arg == "-i":
+			if len(args) > 0:
+				input = args.pop(0)
+				help = False
+		elif arg == "-o":
+			if len(args) > 0:
+				output = args.pop(0)
+				help = False
+		elif arg == "-j":
+			if len(args) > 0:
+				settings["jobs"] = int(args.pop(0))
+				help = False
+		elif arg == "-profile":
+			settings["profile"] = True
+			help = False
+		elif arg == "-pstats":
+			if len(args) > 0:
+				settings["pstats"] = int(args.pop(0))
+				help = False
+		elif arg == "-watch":
+			watching = True
+			help = False
+		elif arg == "-unsafe":
+			settings["safe"] = False
+			help = False
+		elif arg == "-optimize":
+			settings["optimize"] = True
+			help = False
+		elif arg == "-shake":
+			settings["shake"] = True
+			help = False
+		elif arg == "-export":
+			if len(args) > 0:
+				settings["exports"].extend(args.pop(0).split(","))
+				settings["shake"] = True
+				help = False
+		elif arg in FLAGS:
+			settings[FLAGS[arg]] = True
+			help = False
+		else:
+			break
+	
+	if help:
+		return None
+	if input is None:
+		input = "./input"
+	if output is None:
+		output = "./output"
+	return input, output, watching, settings
+
+
+def show_help():
+	print("Help:")
+	print("  -i <path> - path to input file or directory. Default: `./input`")
+	print("  -o <path> - path to output directory. Default: `./output`")
+	print("  -j <number> - number of processes translating files in parallel. Default: 1")
+	print("  -profile - reports time of every phase of translation, and saves the report into `lupy-profile.json`")
+	print("  -pstats <number> - saves `cProfile` statistics of every phase for this number of the slowest files")
+	print("  -watch - keeps running and translates files again when they are changed")
+	print("  -unsafe - turns off semantical checks")
+	print("  -optimize - computes constant expressions and removes unreachable code")
+	print("  -shake - removes functions which are never used by the top-level code")
+	print("  -export <names> - comma-separated names of functions kept by `-shake` even if they are unused")
+	print("  -local - declares variables of functions as `local`")
+	print("  -arrays - translates lists into Lua sequences starting from 1")
+	print("  -hoist - computes lengths and looks up functions used in loops once before the loop")
+	print("  -buffers - builds strings extended in loops with `table.concat`")
+	print("  -compact - writes code without indentation and empty lines, with a `.lines` map of lines next to it")
+	print("  -map - writes source map from Lua code to python code next to every `.lua` file")
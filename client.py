@@ -0,0 +1,73 @@
+"""
+Client of the translation daemon (`daemon.py`), a drop-in replacement for `python lupy.py -i <path> -o <path> ...`
+which doesn't load the translator. If the daemon isn't running, files are translated by the client itself.
+
+Usage: python client.py [-socket <path>] <arguments of lupy.py>
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+from cli import parse_arguments, show_help
+
+SOCKET_PATH = os.path.join(tempfile.gettempdir(), "lupy-{}.sock".format(os.getuid()))
+
+
+def request(requests: list, path=SOCKET_PATH) -> list:
+	"""Sends requests to the daemon and returns responses in the order of requests."""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+		connection.connect(path)
+		with connection.makefile("rw", encoding="utf-8") as stream:
+			for i, item in enumerate(requests):
+				stream.write(json.dumps(dict(item, id=i)) + "\n")
+			stream.flush()
+			connection.shutdown(socket.SHUT_WR)
+			responses = [json.loads(line) for line in stream]
+	return sorted(responses, key=lambda response: response["id"])
+
+
+def main():
+	args = sys.argv[1:]
+	path = SOCKET_PATH
+	if len(args) > 1 and args[0] == "-socket":
+		path = args[1]
+		args = args[2:]
+	arguments = parse_arguments(args)
+	if arguments is None:
+		print(__doc__.strip())
+		print()
+		show_help()
+		return
+	input, output, watching, settings = arguments
+	if watching:
+		print("Warning: -watch isn't supported by the daemon, files are translated once")
+	jobs = settings.pop("jobs")
+	message = {
+		"input": os.path.abspath(input),
+		"output": os.path.abspath(output),
+		"safe": settings.pop("safe"),
+		"optimize": settings.pop("optimize"),
+		"shake": settings.pop("shake"),
+		"exports": settings.pop("exports"),
+		"profile": settings.pop("profile"),
+		"pstats": settings.pop("pstats"),
+		"options": settings,
+	}
+	try:
+		response = request([message], path)[0]
+	except OSError:
+		# daemon isn't running, translator is loaded only in this case
+		from lupy import process
+		process(input, output, message["safe"], message["optimize"], message["shake"], message["exports"], jobs,
+				message["profile"], message["pstats"], **settings)
+		return
+	if "error" in response:
+		print("Error:", response["error"])
+		sys.exit(1)
+	sys.stdout.write(response["report"])
+
+
+if __name__ == '__main__':
+	main()
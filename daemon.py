@@ -0,0 +1,187 @@
+"""
+Translation daemon: keeps LuPy loaded in a pool of processes and serves requests
+over a Unix domain socket or stdin/stdout, so translation doesn't pay for the start of python and loading of grammar.
+
+Protocol: every request and response is a JSON object on a separate line.
+Requests take the same arguments as `lupy.translate` or `lupy.process`:
+  {"id": 1, "code": "x = 1\\n", "safe": true, "options": {"compact": true}}
+  {"id": 2, "input": "/src/a.py", "output": "/out", "optimize": true}
+Responses are sent as soon as requests are done (possibly in a different order), with the same `id`:
+  {"id": 1, "lua": "x=1", "time": 0.004, "total": 0.005}
+  {"id": 2, "report": "Translation started...", "time": 0.02, "total": 0.02}
+  {"id": 3, "error": "..."}
+`time` is the time of translation, `total` also includes the time request waited for a free worker
+(and for other requests which process files into the same output directory, they are run one at a time).
+With `"profile": true` responses also get time of every phase of translation (`profile`, or in `report`).
+
+Usage: python daemon.py [-socket <path> | -stdio] [-j <number>]
+Files are translated with the daemon by `client.py`, which takes the same arguments as `lupy.py`.
+"""
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from client import SOCKET_PATH
+from errors import AnalyzerError
+from lupy import init_worker, process, translate
+from profiler import Profile
+
+# `process` requests read and write the manifest of the output directory, so requests for the same directory
+# are run one at a time; locks are taken by absolute path of the directory
+output_locks = {}
+output_locks_lock = threading.Lock()
+
+def execute(request: dict) -> dict:
+	"""Handles one request in the worker process."""
+	start = time.perf_counter()
+	arguments = {
+		"safe": request.get("safe", True),
+		"optimize": request.get("optimize", False),
+		"shake": request.get("shake", False),
+		"exports": request.get("exports", ()),
+	}
+	options = request.get("options", {})
+	try:
+		if "code" in request:
+			profile = Profile() if request.get("profile", False) else None
+			response = {"lua": translate(request["code"], profile=profile, **arguments, **options)}
+			if profile is not None:
+				response["profile"] = profile.as_dict()
+		else:
+			report = io.StringIO()
+			# workers run one request at a time, so output of `process` can be captured
+			with redirect_stdout(report):
+				try:
+					process(request["input"], request["output"], profile=request.get("profile", False),
+							pstats=request.get("pstats", 0), **arguments, **options)
+				except SystemExit:
+					pass
+			response = {"report": report.getvalue()}
+	except (AnalyzerError, OSError, KeyError, TypeError) as e:
+		response = {"error": "{}: {}".format(type(e).__name__, e)}
+	response["time"] = time.perf_counter() - start
+	return response
+
+
+def submit(executor: ProcessPoolExecutor, request: dict) -> Future:
+	"""Starts the request in the pool, `process` request waits until requests for its output directory are done."""
+	output = request.get("output")
+	if "code" in request or not isinstance(output, str):
+		return executor.submit(execute, request)
+	with output_locks_lock:
+		lock = output_locks.setdefault(os.path.abspath(output), threading.Lock())
+	future = Future()
+
+	def run():
+		with lock:
+			try:
+				future.set_result(executor.submit(execute, request).result())
+			except Exception as e:
+				future.set_exception(e)
+
+	threading.Thread(target=run, daemon=True).start()
+	return future
+
+
+def serve_stream(reader, writer, executor: ProcessPoolExecutor):
+	"""Reads requests from text stream until it's closed, responses are written as soon as they're ready."""
+	lock = threading.Lock()
+	finished = threading.Semaphore(0)
+	count = 0
+
+	def respond(response: dict):
+		with lock:
+			writer.write(json.dumps(response) + "\n")
+			writer.flush()
+
+	def finish(request_id, start, future):
+		try:
+			response = future.result()
+		except Exception as e:
+			response = {"error": "{}: {}".format(type(e).__name__, e)}
+		response["id"] = request_id
+		response["total"] = time.perf_counter() - start
+		try:
+			respond(response)
+		finally:
+			finished.release()
+
+	for line in reader:
+		if len(line.strip()) == 0:
+			continue
+		start = time.perf_counter()
+		try:
+			request = json.loads(line)
+			if not isinstance(request, dict):
+				raise ValueError("request must be an object")
+		except ValueError as e:
+			respond({"id": None, "error": "Invalid request: {}".format(e)})
+			continue
+		future = submit(executor, request)
+		future.add_done_callback(lambda done, request_id=request.get("id"), start=start: finish(request_id, start, done))
+		count += 1
+	# stream stays open until all responses are written
+	for _ in range(count):
+		finished.acquire()
+
+
+class SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+	def __init__(self, path: str, executor: ProcessPoolExecutor):
+		self.executor = executor
+		super().__init__(path, ConnectionHandler)
+
+
+class ConnectionHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		reader = io.TextIOWrapper(self.rfile, encoding="utf-8")
+		writer = io.TextIOWrapper(self.wfile, encoding="utf-8", write_through=True)
+		serve_stream(reader, writer, self.server.executor)
+
+
+def serve(path=SOCKET_PATH, stdio=False, jobs=None):
+	"""Serves requests over the socket at `path` (or stdin/stdout) until it's interrupted."""
+	with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+		if stdio:
+			serve_stream(sys.stdin, sys.stdout, executor)
+			return
+		if os.path.exists(path):
+			os.remove(path)
+		with SocketServer(path, executor) as server:
+			print("Serving on {}".format(path))
+			try:
+				server.serve_forever()
+			except KeyboardInterrupt:
+				print("Daemon stopped")
+			finally:
+				os.remove(path)
+
+
+def main():
+	args = sys.argv[1:]
+	path = SOCKET_PATH
+	stdio = False
+	jobs = None
+	while len(args) > 0:
+		arg = args.pop(0)
+		if arg == "-socket" and len(args) > 0:
+			path = args.pop(0)
+		elif arg == "-stdio":
+			stdio = True
+		elif arg == "-j" and len(args) > 0:
+			jobs = int(args.pop(0))
+		else:
+			print(__doc__.strip())
+			return
+	serve(path, stdio, jobs)
+
+
+if __name__ == '__main__':
+	main()
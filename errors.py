@@ -20,9 +20,24 @@ class SemanticError(AnalyzerError):
         super(SemanticError, self).__init__(*args)
 
 
+class Diagnostic:
+    """Syntax error: token which can't be parsed (line and position from 1) and terminals expected instead of it."""
+    def __init__(self, line, pos, found, expected):
+        self.line = line
+        self.pos = pos
+        self.found = found
+        self.expected = expected
+
+    def __str__(self):
+        found = self.found if self.found in ("newline", "indent", "dedent", "end of file") else "'{}'".format(self.found)
+        return "Line {} position {}: unexpected {}, expected: {}".format(self.line, self.pos, found, ", ".join(self.expected))
+
+
 class SyntacticError(AnalyzerError):
-    def __init__(self):
-        super().__init__("Syntactic Error\nUnable to parse code using Earley Parser")
+    def __init__(self, diagnostics=()):
+        self.diagnostics = list(diagnostics)
+        message = "Syntactic Error\nUnable to parse code using Earley Parser"
+        super().__init__("\n".join([message] + [str(diagnostic) for diagnostic in self.diagnostics]))
 
 
 class NoNewLineError(AnalyzerError):
@@ -1,42 +1,213 @@
-from parse import TreeToken
+import re
+
+from parse import TreeToken, SyntaxTree
 from lexer import Token
-from nltk.tree import ParentedTree
+from scopes import LocalScopes, CollectionKinds, LoopInvariants, LIST, STRING, unused_name, length_argument, \
+	concatenation, has_string_literal, accumulators, sum_operands
+from visitor import Visitor, visits
+import sourcemap
+
+WHITESPACE = re.compile(r"(\s+)")
+WORD_CHARACTERS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+DIGITS = frozenset("0123456789")
+# options which need names and values of the whole program before generation
+PROGRAM_OPTIONS = ["local_variables", "lua_arrays", "hoist_invariants", "string_buffers"]
+
+
+def unroll(tree: SyntaxTree):
+	"""
+	Iterates over elements of right-nested list rule (e.g. `<sentences> -> <sentence> <sentences>`)
+	together with separators between them, without recursion.
+	"""
+	label = tree.label()
+	while True:
+		last = tree[-1]
+		if len(tree) > 1 and isinstance(last, SyntaxTree) and last.label() == label:
+			yield from tree[:-1]
+			tree = last
+		else:
+			yield from tree
+			return
+
 
+def needs_space(previous: str, following: str) -> bool:
+	"""Tells whether two chunks of Lua code would merge into different tokens without a space between them."""
+	if previous in WORD_CHARACTERS and following in WORD_CHARACTERS:
+		return True
+	# `--` starts a comment, `...` is vararg, `1..a` is a malformed number, `[[` starts a long string
+	return (previous == following and previous in "-.[") or (previous in DIGITS and following == ".")
 
-class Generator:
+
+class BufferSink:
+	"""
+	Default output of the generator: keeps written chunks in a list and joins them once,
+	instead of growing a single string with every token.
+	"""
 	
 	def __init__(self):
-		self.pos = 0
-		self.line = 0
-		self.lua_code = ""
+		self.chunks = []
+	
+	def write(self, text: str):
+		self.chunks.append(text)
+	
+	def getvalue(self) -> str:
+		return "".join(self.chunks)
 	
-	def generate(self, tree: ParentedTree):
+	def take(self) -> str:
+		"""Returns code written since the previous call and forgets it."""
+		value = "".join(self.chunks)
+		self.chunks = []
+		return value
+
+
+class Generator(Visitor):
+	
+	def __init__(self, local_variables=False, lua_arrays=False, hoist_invariants=False, string_buffers=False,
+			compact=False, source_map=False):
+		"""
+		:param local_variables: declare variables of functions and top-level functions as `local`
+			where it doesn't change the meaning of the program
+		:param lua_arrays: translate lists and sets into Lua sequences that start from 1 (`{a, b}`)
+			instead of tables with explicit keys from 0 (`{[0] = a, [1] = b}`).
+			Loops over values known to be lists are translated into `ipairs` loops over their values.
+		:param hoist_invariants: compute lengths and look up global functions used in loops once,
+			into locals declared before the loop (`do local print, len_a = print, #a; while ... end end`)
+		:param string_buffers: collect parts of strings extended in loops (`s = s + part`) into a table
+			and concatenate them once after the loop, instead of copying the string on every iteration
+		:param compact: ignore positions of tokens in the source, and write code with minimal whitespace:
+			no indentation, no empty lines and spaces only where tokens would merge without them.
+			Lines of the source are kept apart, so `line_map` still points from Lua code to Python.
+		:param source_map: remember position in the source of every token written,
+			for `build_source_map` to be called after generation
+		"""
+		self.local_variables = local_variables
+		self.lua_arrays = lua_arrays
+		self.hoist_invariants = hoist_invariants
+		self.string_buffers = string_buffers
+		self.compact = compact
+		self.source_map = source_map
 		self.pos = 0
 		self.line = 0
-		self.lua_code = ""
+		self.sink = BufferSink()
+		# line of the source code for every line of generated code
+		self.line_map = []
+		# whitespace which has to be written before the next chunk of code in compact mode
+		self.separator = ""
+		self.last_character = ""
+		# segments of source map for every line of generated code, the token which is written next, column of output
+		self.mappings = None
+		self.mark = None
+		self.column = 0
+		self.scopes = None
+		self.program = None
+		self.collections = None
+		self.key_name = "_"
+		self.invariants = None
+		# names of hoisted lengths by measured variable, and hoisted functions, for the loops being generated
+		self.hoisted_lengths = {}
+		self.hoisted_functions = set()
+		# names of tables which collect parts of strings in the loops being generated
+		self.buffers = {}
+		# parts which wait for kinds of global names in `awaited`, and names assigned by them
+		self.held = []
+		self.held_names = set()
+		self.awaited = set()
+	
+	def generate(self, tree: SyntaxTree, out=None):
+		"""
+		Writes Lua code for the tree into `out`, which can be any object with `write` method
+		(e.g. text file). If `out` is not set, code is collected in memory and returned as a string.
+		"""
+		self.begin(out, tree[0])
 		self.generate_program(tree[0])
-		return self.lua_code
-	
-	def generate_program(self, tree: ParentedTree):
-		for child in tree:
-			if child.label() == "<function>":
-				self.generate_function(child)
-			elif child.label() == "<sentence>":
-				self.generate_sentence(child)
-			elif child.label() == "<program>":
-				self.generate_program(child)
-			else:
-				raise Exception()
-		
-	def generate_function(self, tree: ParentedTree):
+		return self.end(out)
+	
+	def begin(self, out=None, program: SyntaxTree = None):
+		"""
+		Starts generation of the program. Without `program`, code is generated in parts by `generate_part`,
+		and options which need the whole program in advance can't be used.
+		"""
+		if program is None:
+			options = [name for name in PROGRAM_OPTIONS if getattr(self, name)]
+			if len(options) > 0:
+				raise ValueError("Options need the whole program: {}".format(", ".join(options)))
+		self.pos = 0
+		self.line = 0
+		self.sink = BufferSink() if out is None else out
+		self.line_map = [] if self.compact else [0]
+		self.separator = ""
+		self.last_character = ""
+		self.mappings = [] if self.source_map else None
+		self.mark = None
+		self.column = 0
+		self.scopes = LocalScopes(program) if self.local_variables else None
+		self.program = program
+		# kinds of values of a program generated in parts are known from the parts generated so far
+		self.collections = None if program is not None else CollectionKinds()
+		self.held = []
+		self.held_names = set()
+		self.awaited = set()
+		if self.lua_arrays:
+			self.key_name = unused_name(self.value_kinds().names, "_")
+		self.invariants = LoopInvariants(program, self.value_kinds()) if self.hoist_invariants else None
+		self.hoisted_lengths = {}
+		self.hoisted_functions = set()
+		self.buffers = {}
+	
+	def generate_part(self, tree: SyntaxTree):
+		"""
+		Writes Lua code of the next part of the program (tree of its following top-level statements).
+		Functions may use global names which are assigned after them (`s` in `def f(a): return s + a` before `s = ""`),
+		then the part is held back with the parts after it until these names are assigned, or until `end`,
+		so the code is the same as if the whole program was generated at once.
+		"""
+		assigned, unknown = self.collections.forward_names(tree[0])
+		self.held.append(tree[0])
+		self.held_names |= assigned
+		self.awaited = (self.awaited | unknown) - self.held_names
+		if len(self.awaited) == 0:
+			self.release()
+	
+	def release(self):
+		"""Generates the parts held back by `generate_part`."""
+		self.collections.add(*self.held)
+		for program in self.held:
+			self.generate_program(program)
+		self.held = []
+		self.held_names = set()
+		self.awaited = set()
+	
+	def end(self, out=None):
+		"""Finishes generation, code is returned as a string if `out` was not set."""
+		if len(self.held) > 0:
+			self.release()
+		if out is None:
+			return self.sink.getvalue()
+		if hasattr(out, "flush"):
+			out.flush()
+	
+	@visits("<program>")
+	def generate_program(self, tree: SyntaxTree):
+		for child in unroll(tree):
+			self.visit(child)
+	
+	@visits("<function>")
+	def generate_function(self, tree: SyntaxTree):
 		start_token: Token = tree[0].token
 		self.go_to(start_token)
-		self.add("function ", 4)
+		if self.is_local(tree[1]):
+			self.add("local function ", 4)
+		else:
+			self.add("function ", 4)
 		self.generate_terminal(tree[1])
 		self.add("(")
-		if isinstance(tree[3], ParentedTree):
+		if isinstance(tree[3], SyntaxTree):
 			self.generate_identifiers(tree[3])
 		self.add(")")
+		if self.scopes is not None:
+			declared = self.scopes.declared_in(start_token)
+			if len(declared) > 0:
+				self.add(" local " + ", ".join(declared), 0)
 		colon: Token = tree[-2].token
 		self.go_to_pos(colon.pos + 1, colon.line)
 		block = tree[-1]
@@ -46,34 +217,26 @@ class Generator:
 		else:
 			self.add("\n" + " " * start_token.pos + "end", 0)
 	
-	def generate_block(self, tree: ParentedTree):
+	@visits("<block>")
+	def generate_block(self, tree: SyntaxTree):
 		if len(tree) == 1:
 			self.generate_simple_sentence(tree[0])
 		else:
 			self.newline()
 			self.generate_sentences(tree[2])
 			
-	def generate_sentences(self, tree: ParentedTree):
-		current = tree[0]
-		self.generate_sentence(current)
-		if len(tree) > 1:
-			self.generate_sentences(tree[1])
-	
-	def generate_sentence(self, tree: ParentedTree):
-		internal = tree[0]
-		if internal.label() == "<simple_sentence>":
-			self.generate_simple_sentence(internal)
-		elif internal.label() == "<complex_sentence>":
-			self.generate_complex_sentence(internal)
-	
-	def generate_complex_sentence(self, tree: ParentedTree):
-		internal = tree[0]
-		if internal.label() == "<condition>":
-			self.generate_condition(internal)
-		elif internal.label() == "<loop>":
-			self.generate_loop(internal)
-	
-	def generate_condition(self, tree: ParentedTree):
+	@visits("<sentences>")
+	def generate_sentences(self, tree: SyntaxTree):
+		for sentence in unroll(tree):
+			self.visit(sentence)
+	
+	@visits("<sentence>", "<complex_sentence>", "<sentence_body>", "<any_expressions>", "<left_expressions>")
+	def generate_internal(self, tree: SyntaxTree):
+		"""Generates node which only wraps one of the alternatives."""
+		self.visit(tree[0])
+	
+	@visits("<condition>")
+	def generate_condition(self, tree: SyntaxTree):
 		if_token: Token = tree[0].token
 		self.go_to(if_token)
 		self.add(if_token.content)
@@ -87,65 +250,118 @@ class Generator:
 		else:
 			self.add(" end", 0)
 			
-	def generate_conditional(self, tree: ParentedTree):
-		self.generate_boolean_expression(tree[0])
-		colon: Token = tree[1].token
-		self.go_to(colon)
-		self.add(" then", 1)
-		self.generate_block(tree[2])
-		
-		if len(tree) > 3:
-			self.generate_otherwise(tree[3])
+	@visits("<conditional>")
+	def generate_conditional(self, tree: SyntaxTree):
+		while tree is not None:
+			self.generate_boolean_expression(tree[0])
+			colon: Token = tree[1].token
+			self.go_to(colon)
+			self.add(" then", 1)
+			self.generate_block(tree[2])
+			tree = self.generate_otherwise(tree[3]) if len(tree) > 3 else None
 		
-	def generate_otherwise(self, tree: ParentedTree):
-		first_token: Token = tree[0].token
-		self.go_to(first_token)
+	def generate_otherwise(self, tree: SyntaxTree):
+		"""Generates `elif` or `else` branch. Returns conditional of `elif` that has to be generated next."""
+		first: Token = tree[0].token
+		self.go_to(first)
 		if len(tree) == 2:
 			self.add("elseif", 4)
-			self.generate_conditional(tree[1])
-		else:
-			self.add(first_token.content)
-			colon: Token = tree[1].token
-			self.go_to_pos(colon.pos + 1, colon.line)
-			self.generate_block(tree[2])
+			return tree[1]
+		self.add(first.content)
+		colon: Token = tree[1].token
+		self.go_to_pos(colon.pos + 1, colon.line)
+		self.generate_block(tree[2])
+		return None
 	
-	def generate_loop(self, tree: ParentedTree):
+	@visits("<loop>")
+	def generate_loop(self, tree: SyntaxTree):
 		internal = tree[0]
-		if internal.label() == "<while_loop>":
-			self.generate_while(internal)
-		elif internal.label() == "<for_loop>":
-			self.generate_for(internal)
+		start_token = internal[0].token
+		hoisted = self.hoist(internal) if self.invariants is not None else None
+		buffered = self.open_buffers(internal) if self.string_buffers else []
+		self.visit(internal)
 		
 		block = internal[-1]
-		start_token = tree.leaves()[0].token
 		if len(block) == 1:
 			self.add(" end", 0)
 		else:
 			self.add("\n" + " " * start_token.pos + "end", 0)
-	
-	def generate_while(self, tree: ParentedTree):
+		if len(buffered) > 0:
+			self.close_buffers(buffered)
+		if hoisted is not None:
+			self.add(" end", 0)
+			lengths, functions = hoisted
+			for name in lengths:
+				del self.hoisted_lengths[name]
+			self.hoisted_functions.difference_update(functions)
+	
+	def hoist(self, loop: SyntaxTree):
+		"""Declares invariants of the loop in a `do` block around it. Returns hoisted lengths and functions."""
+		functions = [name for name in self.invariants.functions(loop) if name not in self.hoisted_functions]
+		lengths = [name for name in self.invariants.lengths(loop) if name not in self.hoisted_lengths]
+		if len(functions) == 0 and len(lengths) == 0:
+			return None
+		names = functions + [unused_name(self.invariants.names, "len_" + name) for name in lengths]
+		values = functions + ["#" + name for name in lengths]
+		self.go_to(loop[0].token)
+		self.add("do local " + ", ".join(names) + " = " + ", ".join(values) + "; ", 0)
+		self.hoisted_lengths.update(zip(lengths, names[len(functions):]))
+		self.hoisted_functions.update(functions)
+		return lengths, functions
+	
+	def open_buffers(self, loop: SyntaxTree) -> list:
+		"""Declares tables for parts of strings extended in the loop. Returns names of the strings."""
+		names = [name for name in accumulators(loop, self.value_kinds()) if name not in self.buffers]
+		if len(names) == 0:
+			return names
+		buffers = [unused_name(self.value_kinds().names, name + "_parts") for name in names]
+		self.go_to(loop[0].token)
+		self.add("do local " + ", ".join(buffers) + " = " + ", ".join("{" + name + "}" for name in names) + "; ", 0)
+		self.buffers.update(zip(names, buffers))
+		return names
+	
+	def close_buffers(self, names: list):
+		for name in names:
+			self.add(" " + name + " = table.concat(" + self.buffers.pop(name) + ")", 0)
+		self.add(" end", 0)
+	
+	@visits("<while_loop>")
+	def generate_while(self, tree: SyntaxTree):
 		while_token: Token = tree[0].token
 		self.go_to(while_token)
 		self.add(while_token.content)
 		self.generate_boolean_expression(tree[1])
 		colon: Token = tree[2].token
-		self.go_to_pos(colon.pos + 1, colon.line)
+		self.go_to(colon)
+		self.add(" do", 1)
 		self.generate_block(tree[3])
 	
-	def generate_for(self, tree: ParentedTree):
+	@visits("<for_loop>")
+	def generate_for(self, tree: SyntaxTree):
 		for_token: Token = tree[0].token
 		self.go_to(for_token)
 		self.add(for_token.content)
+		is_collection = isinstance(tree[3], SyntaxTree)
+		# python iterates over values of lists, so they are iterated with `ipairs`, skipping the index
+		over_list = is_collection and self.value_kinds().kind_of(tree[3]) == LIST
+		# literal isn't stored anywhere, so it's written as a sequence even if lists start from 0
+		sequence = over_list and (self.lua_arrays or not isinstance(tree[3][0], SyntaxTree))
+		if over_list and not sequence:
+			self.generate_indexed_for(tree)
+			return
+		if sequence:
+			self.go_to(tree[1].first_token)
+			key_name = self.key_name if self.lua_arrays else unused_name(self.value_kinds().names, "_")
+			self.add(key_name + ", ", 0)
 		self.generate_terminal(tree[1])
 		in_token: Token = tree[2].token
 		self.go_to(in_token)
-		is_collection = isinstance(tree[3], ParentedTree)
 		if is_collection:
 			self.add(in_token.content)
-			first: Token = tree[3].leaves()[0].token
+			first: Token = tree[3].first_token
 			self.go_to(first)
-			self.add("pairs(", 0)
-			self.generate_collection(tree[3])
+			self.add("ipairs(" if sequence else "pairs(", 0)
+			self.generate_collection(tree[3], sequence)
 			self.add(")", 0)
 		else:
 			self.add("=", 2)
@@ -157,7 +373,7 @@ class Generator:
 			self.pos += len(bracket.content)
 			
 			has_both = tree[6].token.content == ","
-			end: ParentedTree = tree[5]
+			end: SyntaxTree = tree[5]
 			if has_both:
 				self.generate_mathematical_expressions(tree[5])
 				self.generate_token(tree[6])
@@ -165,9 +381,9 @@ class Generator:
 			else:
 				self.add("0, ", 0)
 			
-			first: Token = end.leaves()[0].token
+			first: Token = end.first_token
 			self.go_to(first)
-			if len(end.leaves()) == 1:
+			if end.leaf_count == 1 and first.content.isdigit():
 				self.add(str(int(first.content) - 1), len(first.content))
 			else:
 				self.add("(", 0)
@@ -183,139 +399,160 @@ class Generator:
 		self.add(" do", 1)
 		self.generate_block(tree[-1])
 	
-	def generate_simple_sentence(self, tree: ParentedTree):
+	def generate_indexed_for(self, tree: SyntaxTree):
+		"""
+		Generates loop over values of a list variable whose keys start from 0, which `ipairs` would skip:
+		`for i = 0, a[0] == nil and -1 or #a do local x = a[i] ... end`.
+		"""
+		variable: Token = tree[1].first_token
+		name = tree[3].first_token.content
+		index = unused_name(self.value_kinds().names, "i")
+		self.go_to(variable)
+		self.add(index, len(variable.content))
+		self.go_to(tree[2].token)
+		self.add("=", len(tree[2].token.content))
+		self.go_to(tree[3].first_token)
+		self.add("0, {}[0] == nil and -1 or #".format(name), 0)
+		self.generate_collection(tree[3])
+		self.go_to(tree[-2].token)
+		self.add(" do", 1)
+		self.add(" local {} = {}[{}]".format(variable.content, name, index), 0)
+		self.generate_block(tree[-1])
+	
+	@visits("<simple_sentence>")
+	def generate_simple_sentence(self, tree: SyntaxTree):
 		if len(tree) > 1:
-			self.generate_sentence_body(tree[0])
+			self.visit(tree[0])
 	
-	def generate_sentence_body(self, tree: ParentedTree):
-		internal = tree[0]
-		if internal.label() == "<function_call>":
-			self.generate_function_call(internal)
-		elif internal.label() == "<String>":
-			self.generate_terminal(internal)
-		elif internal.label() == "<output>":
-			self.generate_output(internal)
-		elif internal.label() == "<assignment>":
-			self.generate_assignment(internal)
-		elif internal.label() == "<special_body>":
-			self.generate_special_body(internal)
-	
-	def generate_special_body(self, tree: ParentedTree):
+	@visits("<special_body>")
+	def generate_special_body(self, tree: SyntaxTree):
 		first: Token = tree[0].token
 		self.go_to(first)
 		if first.content == "pass":
 			self.skip(first)
 		elif first.content == "return":
 			self.add(first.content)
-			self.generate_any_expressions(tree[1])
+			self.visit(tree[1])
 	
-	def generate_length_expressions(self, tree: ParentedTree):
+	@visits("<length_expressions>")
+	def generate_length_expressions(self, tree: SyntaxTree):
 		first: Token = tree[0].token
 		self.go_to(first)
+		name = length_argument(tree) if len(self.hoisted_lengths) > 0 else None
+		if name in self.hoisted_lengths:
+			self.add(self.hoisted_lengths[name], 0)
+			self.skip(tree[-1].token)
+			return
 		self.add("#", len(first.content))
 		self.generate_token(tree[1])
-		content = tree[2]
-		if content.label() == "<function_call>":
-			self.generate_function_call(content)
-		elif content.label() == "<Identifier>":
-			self.generate_terminal(content)
-		elif content.label() == "<collection>":
-			self.generate_collection(content)
+		self.visit(tree[2])
 		self.generate_token(tree[3])
 	
-	def generate_assignment(self, tree: ParentedTree):
+	@visits("<assignment>")
+	def generate_assignment(self, tree: SyntaxTree):
+		if len(self.buffers) > 0 and tree[0].first_token.content in self.buffers:
+			self.generate_accumulation(tree)
+			return
+		if self.is_local(tree[0]):
+			self.go_to(tree[0].first_token)
+			self.add("local ", 0)
 		self.generate_terminal(tree[0])
 		self.generate_token(tree[1])
-		self.generate_any_expressions(tree[2])
-	
-	def generate_output(self, tree: ParentedTree):
+		self.visit(tree[2])
+	
+	def generate_accumulation(self, tree: SyntaxTree):
+		"""Generates `s = s + a + b` as adding of `a .. b` to the table with parts of `s`."""
+		start: Token = tree[0].first_token
+		buffer = self.buffers[start.content]
+		parts = concatenation(tree[2][0])[2:]
+		self.go_to(start)
+		self.add(buffer + "[#" + buffer + " + 1] = ", parts[0].first_token.pos - start.pos)
+		self.generate_concatenation(parts, True)
+	
+	@visits("<output>")
+	def generate_output(self, tree: SyntaxTree):
 		self.generate_token(tree[0])
 		self.generate_token(tree[1])
-		self.generate_any_expressions(tree[2])
+		self.visit(tree[2])
 		self.generate_token(tree[3])
 	
-	def generate_expressions(self, tree: ParentedTree):
-		self.generate_any_expressions(tree[0])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_expressions(tree[2])
-	
-	def generate_any_expressions(self, tree: ParentedTree):
-		internal = tree[0]
-		if internal.label() == "<Identifier>":
-			self.generate_terminal(internal)
-		elif internal.label() == "<String_expressions>":
-			self.generate_string_expressions(internal)
-		elif internal.label() == "<mathematical_expressions>":
-			self.generate_mathematical_expressions(internal)
-		elif internal.label() == "<boolean_expressions>":
-			self.generate_boolean_expression(internal)
-		elif internal.label() == "<function_call>":
-			self.generate_function_call(internal)
-		elif internal.label() == "<collection>":
-			self.generate_collection(internal)
-	
-	def generate_boolean_expression(self, tree: ParentedTree):
-		first = tree[0]
-		if isinstance(first, ParentedTree):
-			if first.label() == "<boolean>":
-				token = first[0].token
-				self.go_to(token)
-				self.add(token.content.lower())
-			elif first.label() == "<Identifier>":
-				self.generate_terminal(first)
-			elif first.label() == "<function_call>":
-				self.generate_function_call(first)
-			elif first.label() == "<comparison_expressions>":
-				self.generate_comparison_expressions(first)
+	@visits("<expressions>")
+	def generate_expressions(self, tree: SyntaxTree):
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.generate_token(item)
 			else:
-				op = tree[1][0]
-				self.generate_boolean_expression(tree[0])
-				if isinstance(op, ParentedTree):
-					self.generate_equivalence_operations(op)
+				self.visit(item)
+	
+	@visits("<boolean_expressions>")
+	def generate_boolean_expression(self, tree: SyntaxTree):
+		# operands of `and`, `or` and `not` can be nested on both sides,
+		# so they are walked with explicit stack instead of recursion
+		pending = [tree]
+		while pending:
+			tree = pending.pop()
+			if isinstance(tree, TreeToken):
+				self.generate_token(tree)
+				continue
+			first = tree[0]
+			if tree.label() == "<logical_operation>":
+				if isinstance(first, SyntaxTree):
+					self.visit(first)
 				else:
-					self.go_to(op.token)
-					self.add(op.token.content)
-				self.generate_boolean_expression(tree[2])
-		elif first.token.content == "not":
-			self.generate_token(first)
-			self.generate_boolean_expression(tree[1])
-	
-	def generate_comparison_expressions(self, tree: ParentedTree):
-		first = tree[0]
-		if first.label() == "<mathematical_expressions>":
-			self.generate_mathematical_expressions(tree[0])
-			self.generate_comparison_operations(tree[1])
-			self.generate_mathematical_expressions(tree[2])
-		elif first.label() == "<String_expressions>":
-			self.generate_string_expressions(tree[0])
-			self.generate_equivalence_operations(tree[1])
-			self.generate_string_expressions(tree[2])
-	
-	def generate_mathematical_expressions(self, tree: ParentedTree):
+					self.generate_token(first)
+			elif isinstance(first, SyntaxTree) and first.label() != "<boolean_expressions>":
+				self.visit(first)
+			else:
+				pending.extend(reversed(tree))
+	
+	@visits("<boolean>")
+	def generate_boolean(self, tree: SyntaxTree):
+		token = tree[0].token
+		self.go_to(token)
+		self.add(token.content.lower())
+	
+	@visits("<comparison_expressions>")
+	def generate_comparison_expressions(self, tree: SyntaxTree):
+		for operand in tree:
+			self.visit(operand)
+	
+	@visits("<mathematical_expressions>")
+	def generate_mathematical_expressions(self, tree: SyntaxTree):
 		self.generate_first_priority(tree[0])
 	
-	def generate_string_expressions(self, tree: ParentedTree):
-		if len(tree) > 1:
-			self.generate_string_expressions(tree[0])
-			self.generate_token(tree[1])
-			self.generate_string_expressions(tree[2])
-		else:
-			internal = tree[0]
-			if internal.label() == "<String>":
-				self.generate_terminal(internal)
-
-	def generate_collection(self, tree: ParentedTree):
-		if isinstance(tree[0], ParentedTree):
-			if tree[0].label() == "<Identifier>":
-				self.generate_terminal(tree[0])
+	@visits("<String_expressions>")
+	def generate_string_expressions(self, tree: SyntaxTree):
+		items = concatenation(tree)
+		self.generate_concatenation(items, self.is_string(items, tree))
+	
+	def generate_concatenation(self, items: list, strings: bool):
+		for item in items:
+			if isinstance(item, TreeToken):
+				self.go_to(item.token)
+				self.add(".." if strings else "+", 1)
 			else:
-				self.generate_function_call(tree[0])
+				self.visit(item)
+	
+	def is_string(self, operands: list, node: SyntaxTree) -> bool:
+		"""Tells whether `+` between operands is a concatenation of strings rather than addition."""
+		if has_string_literal(operands):
+			return True
+		for operand in operands:
+			if isinstance(operand, SyntaxTree) and operand.label() == "<Identifier>":
+				if self.value_kinds().kind_of_name(operand.first_token.content, node) == STRING:
+					return True
+		return False
+
+	@visits("<collection>")
+	def generate_collection(self, tree: SyntaxTree, sequence=False):
+		"""Generates collection, list or set literal is written as a Lua sequence (`{a, b}`) if `sequence` is set."""
+		if isinstance(tree[0], SyntaxTree):
+			self.visit(tree[0])
 		else:
 			first: Token = tree[0].token
 			self.go_to(first)
 			if len(tree) == 2 or (len(tree) == 3 and tree[0].token.content == "dict"):
-				self.skip(tree[-1])
+				self.skip(tree[-1].token)
 				self.add("{}", 0)
 			else:
 				if first.content == "dict":
@@ -327,72 +564,80 @@ class Generator:
 					self.add("}")
 				elif first.content == "[":
 					self.add("{")
-					self.generate_collection_expressions(tree[1])
+					self.generate_collection_expressions(tree[1], sequence)
 					self.go_to(tree[2].token)
 					self.add("}")
 				else:
 					self.generate_token(tree[0])
 					if tree[1].label() == "<expressions>":
-						self.generate_collection_expressions(tree[1])
+						self.generate_collection_expressions(tree[1], sequence)
 					else:
 						self.generate_matches(tree[1])
 					self.generate_token(tree[2])
 	
-	def generate_matches(self, tree: ParentedTree):
-		match = tree[0]
-		self.go_to(match[0].leaves()[0].token)
-		self.add("[", 0)
-		self.generate_left_expressions(match[0])
-		self.add("]", 0)
-		self.go_to(match[1].token)
-		self.add(" =", 1)
-		self.generate_any_expressions(match[2])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_matches(tree[2])
-		
-	def generate_left_expressions(self, tree: ParentedTree):
-		self.generate_any_expressions(tree)
-	
-	def generate_collection_expressions(self, tree: ParentedTree, index=0):
-		self.go_to(tree[0].leaves()[0].token)
-		self.add("[" + str(index) + "] = ", 0)
-		self.generate_any_expressions(tree[0])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_collection_expressions(tree[2], index + 1)
-	
-	def generate_named_expression(self, tree: ParentedTree):
-		self.generate_assignment(tree[0])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_named_expression(tree[2])
+	@visits("<matches>")
+	def generate_matches(self, tree: SyntaxTree):
+		for match in unroll(tree):
+			if isinstance(match, TreeToken):
+				self.generate_token(match)
+				continue
+			self.go_to(match[0].first_token)
+			self.add("[", 0)
+			self.visit(match[0])
+			self.add("]", 0)
+			self.go_to(match[1].token)
+			self.add(" =", 1)
+			self.visit(match[2])
+	
+	def generate_collection_expressions(self, tree: SyntaxTree, sequence=False):
+		index = 0
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.generate_token(item)
+				continue
+			if not self.lua_arrays and not sequence:
+				self.go_to(item.first_token)
+				self.add("[" + str(index) + "] = ", 0)
+			self.visit(item)
+			index += 1
+	
+	@visits("<named_expression>")
+	def generate_named_expression(self, tree: SyntaxTree):
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.generate_token(item)
+			else:
+				self.generate_assignment(item)
 	
-	def generate_function_call(self, tree: ParentedTree):
+	@visits("<function_call>")
+	def generate_function_call(self, tree: SyntaxTree):
 		self.generate_terminal(tree[0])
 		self.generate_token(tree[1])
 		if len(tree) > 3:
 			self.generate_expressions(tree[2])
 		self.generate_token(tree[-1])
 	
-	def generate_identifiers(self, tree: ParentedTree):
-		id_token: Token = tree[0][0].token
-		self.go_to(id_token)
-		self.add(id_token.content)
-		if len(tree) > 1:
-			self.add(",")
-			self.generate_identifiers(tree[2])
-	
-	def generate_comparison_operations(self, tree: ParentedTree):
+	@visits("<Identifiers>")
+	def generate_identifiers(self, tree: SyntaxTree):
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.add(",")
+				continue
+			id_token: Token = item[0].token
+			self.go_to(id_token)
+			self.add(id_token.content)
+	
+	@visits("<comparison_operations>")
+	def generate_comparison_operations(self, tree: SyntaxTree):
 		internal = tree[0]
-		if isinstance(internal, ParentedTree):
+		if isinstance(internal, SyntaxTree):
+			# `<` and `<=` are wrapped into nodes labeled after themselves
 			self.generate_equivalence_operations(internal)
 		else:
-			token = internal.token
-			self.go_to(token)
-			self.add(token.content)
+			self.generate_token(internal)
 	
-	def generate_equivalence_operations(self, tree: ParentedTree):
+	@visits("<equivalence_operations>")
+	def generate_equivalence_operations(self, tree: SyntaxTree):
 		token: Token = tree[0].token
 		self.go_to(token)
 		if token.content == "!=":
@@ -400,41 +645,56 @@ class Generator:
 		else:
 			self.add(token.content)
 	
-	def generate_first_priority(self, tree: ParentedTree):
-		self.generate_second_priority(tree[0])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_first_priority(tree[2])
-	
-	def generate_second_priority(self, tree: ParentedTree):
-		self.generate_third_priority(tree[0])
-		if len(tree) > 1:
-			self.generate_token(tree[1])
-			self.generate_second_priority(tree[2])
+	@visits("<first_priority>")
+	def generate_first_priority(self, tree: SyntaxTree):
+		# sums in parentheses are parsed as arithmetic even if they add strings
+		operands = sum_operands(tree)
+		if operands is not None and len(operands) > 1 and self.is_string(operands, tree):
+			self.generate_concatenation(unroll(tree), True)
+			return
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.generate_token(item)
+			else:
+				self.generate_second_priority(item)
 	
-	def generate_third_priority(self, tree: ParentedTree):
-		self.generate_fourth_priority(tree[0])
-		if len(tree) > 1:
-			token: Token = tree[1].token
-			self.go_to(token)
-			self.add("^", 2)
-			self.generate_third_priority(tree[2])
+	@visits("<second_priority>")
+	def generate_second_priority(self, tree: SyntaxTree):
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.generate_token(item)
+			else:
+				self.generate_third_priority(item)
+	
+	@visits("<third_priority>")
+	def generate_third_priority(self, tree: SyntaxTree):
+		for item in unroll(tree):
+			if isinstance(item, TreeToken):
+				self.go_to(item.token)
+				self.add("^", 2)
+			else:
+				self.generate_fourth_priority(item)
 	
-	def generate_fourth_priority(self, tree: ParentedTree):
+	@visits("<fourth_priority>")
+	def generate_fourth_priority(self, tree: SyntaxTree):
 		if len(tree) > 1:
 			self.generate_token(tree[0])
 			self.generate_first_priority(tree[1])
 			self.generate_token(tree[2])
 		else:
-			internal = tree[0]
-			if internal.label() == "<Number>" or internal.label() == "<Identifier>":
-				self.generate_terminal(internal)
-			elif internal.label() == "<function_call>":
-				self.generate_function_call(internal)
-			elif internal.label() == "<length_expressions>":
-				self.generate_length_expressions(internal)
-	
-	def generate_terminal(self, tree: ParentedTree):
+			self.visit(tree[0])
+	
+	def value_kinds(self) -> CollectionKinds:
+		"""Kinds of values of variables, which are found only once something needs them."""
+		if self.collections is None:
+			self.collections = CollectionKinds(self.program)
+		return self.collections
+	
+	def is_local(self, identifier: SyntaxTree) -> bool:
+		return self.scopes is not None and self.scopes.is_local(identifier.first_token)
+	
+	@visits("<Identifier>", "<Number>", "<String>")
+	def generate_terminal(self, tree: SyntaxTree):
 		self.generate_token(tree[0])
 	
 	def generate_token(self, tree_token: TreeToken):
@@ -445,18 +705,82 @@ class Generator:
 	def add(self, text: str, move: int = -1):
 		if move == -1:
 			move = len(text)
-		self.lua_code += text
+		self.write(text)
 		self.pos += move
 	
+	def write(self, text: str):
+		"""Writes code into the output, and maps new lines of it to the current line of the source."""
+		if self.compact:
+			self.write_compact(text)
+			return
+		for _ in range(text.count("\n")):
+			self.line_map.append(self.line)
+		if self.mappings is not None:
+			code = text.lstrip()
+			leading = text[:len(text) - len(code)]
+			if "\n" in leading:
+				self.column = len(leading) - leading.rfind("\n") - 1
+			else:
+				self.column += len(leading)
+			if len(code) > 0:
+				self.record()
+				self.column += len(code)
+		self.sink.write(text)
+	
+	def record(self):
+		"""Maps current position in generated code to the token which is written there."""
+		if self.mark is None:
+			return
+		line = len(self.line_map) - 1
+		while len(self.mappings) <= line:
+			self.mappings.append([])
+		self.mappings[line].append((self.column, self.mark.line, self.mark.pos))
+		self.mark = None
+	
+	def build_source_map(self, file: str, source: str) -> dict:
+		"""Source map (version 3) of the last generated code, `file` and `source` are paths to Lua and Python code."""
+		lines = self.mappings + [[] for _ in range(len(self.line_map) - len(self.mappings))]
+		return sourcemap.build(lines, file, source)
+	
+	def write_compact(self, text: str):
+		# code added by the generator itself is split by its whitespace, string literals are written as they are
+		parts = [text] if '"' in text or "'" in text else WHITESPACE.split(text)
+		for part in parts:
+			if len(part) == 0:
+				continue
+			if part.isspace():
+				self.separate("\n" if "\n" in part else " ")
+				continue
+			if len(self.line_map) == 0:
+				self.line_map.append(self.line)
+			elif self.separator == "\n":
+				self.sink.write("\n")
+				self.line_map.append(self.line)
+				self.column = 0
+			elif self.separator == " " and needs_space(self.last_character, part[0]):
+				self.sink.write(" ")
+				self.column += 1
+			if self.mappings is not None:
+				self.record()
+				self.column += len(part)
+			self.sink.write(part)
+			self.last_character = part[-1]
+			self.separator = ""
+	
+	def separate(self, separator: str):
+		if self.separator != "\n":
+			self.separator = separator
+	
 	def skip(self, token: Token):
 		self.pos = token.pos + len(token.content)
 	
 	def newline(self, indentation=0):
-		self.lua_code += "\n" + " " * indentation
 		self.line += 1
+		self.write("\n" + " " * indentation)
 		self.pos = indentation
 	
 	def go_to(self, token: Token):
+		self.mark = token
 		self.go_to_pos(token.pos, token.line)
 	
 	def go_to_pos(self, pos: int, line: int):
@@ -466,10 +790,11 @@ class Generator:
 			pos = self.pos
 		
 		if line > self.line:
-			self.lua_code += "\n" * (line - self.line)
+			lines = line - self.line
 			self.line = line
+			self.write("\n" * lines)
 			self.pos = 0
 		
 		if pos > self.pos:
-			self.lua_code += " " * (pos - self.pos)
+			self.write(" " * (pos - self.pos))
 			self.pos = pos
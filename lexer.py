@@ -126,7 +126,7 @@ class PatternDivider(Pattern):
 
 class PatternOperator(Pattern):
 	def regex(self):
-		return r"(?:\+|\-|\*{1,2}|\/|\%|={1,2}|!=|<=|>=|<|>|\bnot\b|\band\b|\bor\b|\bin\b)"
+		return r"(?:\+|\-|\*{1,2}|\/|\%|={1,2}|!=|<=|>=|<|>|not\b|and\b|or\b|in\b)"
 	
 	def token(self, match: str, line: int, pos: int):
 		return TokenOperator(line, pos, match)
@@ -134,7 +134,7 @@ class PatternOperator(Pattern):
 
 class PatternKeyword(Pattern):
 	def regex(self):
-		return r"(?:\bdef\b|\breturn\b|\bbreak\b|\bcontinue\b|\bpass\b|\bfor\b|\bwhile\b|\bif\b|\belif\b|\belse\b|\bprint\b|\brange\b|\blen\b|\bin\b|\bdict\b|\bTrue\b|\bFalse\b)"
+		return r"(?:def\b|return\b|break\b|continue\b|pass\b|for\b|while\b|if\b|elif\b|else\b|print\b|range\b|len\b|in\b|dict\b|True\b|False\b)"
 	
 	def token(self, match: str, line: int, pos: int):
 		return TokenKeyword(line, pos, match)
@@ -157,63 +157,62 @@ class PatternIdentifier(Pattern):
 
 
 class LexicalAnalyzer:
+	"""
+	Splits code into tokens. Patterns are matched at the current index of the code, which is never copied,
+	so a word may start right after the previous token (`1if` is a number and a keyword).
+	"""
 	patterns = [PatternKeyword(), PatternOperator(), PatternIdentifier(), PatternNumber(), PatternDivider(), PatternString()]
+	compiled = [(pattern, re.compile(pattern.regex())) for pattern in patterns]
+	spaces = re.compile(" +")
+	tabs = re.compile("\t*")
 	
 	def parse(self, code):
-		code_copy = code
-		tokens = []
+		return list(self.scan(code))
+	
+	def scan(self, code):
+		"""Yields tokens of the code one by one, so they can be parsed before the whole code is split into tokens."""
+		index = 0
 		pos = 0
 		line = 0
 		indent_level = 0
-		while len(code) > 0:
+		while index < len(code):
 			suc = False
-			for pattern in self.patterns:
-				regex = pattern.regex()
-				res = re.search("^" + regex, code)
+			for pattern, regex in self.compiled:
+				res = regex.match(code, index)
 				if res is not None:
-					endpos = res.regs[0][1]
-					token = pattern.token(code[0:endpos], line, pos)
-					code = code[endpos:]
+					endpos = res.end()
+					token = pattern.token(code[index:endpos], line, pos)
+					pos += endpos - index
+					index = endpos
 					suc = True
-					tokens.append(token)
-					pos += endpos
+					yield token
 					break
 			
 			if suc:
 				continue
 			
-			res = re.match("\n", code)
-			if res is not None:
-				code = code[1:]
-				tokens.append(TokenDivider(line, pos, "newline"))
+			if code[index] == "\n":
+				index += 1
+				yield TokenDivider(line, pos, "newline")
 				pos = 0
 				line += 1
 				
-				res = re.search("^ +", code)
-				if res is not None:
+				if self.spaces.match(code, index) is not None:
 					raise IndentError(line + 1)
 				
-				res = re.search("^\t+", code)
-				if res is not None:
-					endpos = res.regs[0][1]
-				else:
-					endpos = 0
-				
-				pos += 4 * endpos  # standard python tab size
+				tabs = self.tabs.match(code, index).end() - index
+				pos += 4 * tabs  # standard python tab size
 				
-				for i in range(abs(endpos - indent_level)):
-					tokens.append(TokenIndent(endpos > indent_level, line, pos))
-				indent_level = endpos
-				code = code[endpos:]
+				for i in range(abs(tabs - indent_level)):
+					yield TokenIndent(tabs > indent_level, line, pos)
+				indent_level = tabs
+				index += tabs
 				
 				continue
 			
-			res = re.search("^ +", code)
+			res = self.spaces.match(code, index)
 			if res is not None:
-				endpos = res.regs[0][1]
-				pos += endpos
-				code = code[endpos:]
+				pos += res.end() - index
+				index = res.end()
 			else:
-				raise LexicalError(pos, line, code_copy)
-		
-		return tokens
\ No newline at end of file
+				raise LexicalError(pos, line, code)
\ No newline at end of file
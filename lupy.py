@@ -1,77 +1,286 @@
+import asyncio
+import functools
+import hashlib
+import json
 import os
+import signal
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, suppress
 from os import listdir
 from os.path import isfile, join
 
-from nltk import ParentedTree
-
 from generator import Generator
 from lexer import LexicalAnalyzer
-from parse import EarleyParser
+from optimizer import Optimizer, remove_functions
+from parse import DEFAULT_GRAMMAR, EarleyParser, GRAMMAR_PATH, split_statements
+from profiler import aggregate, format_report, phase, Profile
+from scopes import walk
 from semantics import SemanticAnalyzer
 from errors import AnalyzerError
+from cli import parse_arguments, show_help
 
+__version__ = "0.2.0"
+# list of translated files in the output directory, which lets `process` skip files that haven't changed
+MANIFEST = ".lupy-manifest.json"
+# report of `process` with profiling
+PROFILE = "lupy-profile.json"
+# modules which translate the code, their sources are a part of the key of the build
+TRANSLATOR_MODULES = ("errors", "lexer", "parse", "semantics", "optimizer", "scopes", "visitor", "generator", "sourcemap")
 
 analyzer = LexicalAnalyzer()
-generator = Generator()
 
 
-def translate(code, safe=True):
-	tokens = analyzer.parse(code)
-	tree = ParentedTree.convert(EarleyParser(tokens).parse())
-	if safe:
-		SemanticAnalyzer(tree).check_tree()
-	return generator.generate(tree)
+class Translator:
+	"""
+	Reusable translation pipeline with fixed options.
+	Lexer and grammar are shared by all translations and never changed by them, while parser, checks,
+	optimizer and generator are created for every call, so one translator (as well as `translate`)
+	can be used by many threads at once.
+	"""
+
+	def __init__(self, safe=True, optimize=False, shake=False, exports=(), grammar=DEFAULT_GRAMMAR, cache=None,
+				 **options):
+		"""
+		:param safe: check semantics of the code before translation
+		:param optimize: fold constant expressions and remove unreachable branches before generation
+		:param shake: remove functions which are never used by the top-level code, except for names in `exports`
+		:param cache: `cache.TranslationCache` for results of `translate`, it can be shared with other translators
+		:param options: options of the `Generator` (e.g. `local_variables=True`)
+		"""
+		self.lexer = analyzer
+		self.grammar = grammar
+		self.safe = safe
+		self.optimize = optimize
+		self.shake = shake
+		self.exports = tuple(exports)
+		self.options = dict(options)
+		self.cache = cache
+		self.fingerprint = None
+		if cache is not None:
+			description = json.dumps([safe, optimize, shake, sorted(self.exports), sorted(self.options.items())])
+			self.fingerprint = grammar.fingerprint + hashlib.sha256(description.encode()).hexdigest()
+
+	def build_tree(self, code, profile=None):
+		"""Syntax tree of the code, checked and optimized. Phases are measured into `profile` if it's set."""
+		with phase(profile, "lexing"):
+			tokens = self.lexer.parse(code)
+		with phase(profile, "recognition"):
+			parser = EarleyParser(tokens, self.grammar)
+			parser.recognize()
+		with phase(profile, "tree"):
+			tree = parser._get()
+		if profile is not None:
+			profile.count("tokens", len(tokens))
+			profile.count("states", sum(len(entry) for entry in parser.chart.entries))
+			profile.count("nodes", sum(1 for _ in walk(tree)))
+		# reachability of functions is found by semantic analysis, which doesn't raise errors if the code is unsafe
+		if self.safe or self.shake:
+			with phase(profile, "semantics"):
+				semantics = SemanticAnalyzer(tree, strict=self.safe)
+				semantics.check_tree()
+			if self.shake:
+				with phase(profile, "shaking"):
+					remove_functions(tree, semantics.get_reachable_functions(self.exports))
+		if self.optimize:
+			with phase(profile, "optimization"):
+				Optimizer().optimize(tree)
+		return tree
+
+	def generate(self, tree, out=None, profile=None, generator=None):
+		"""
+		Generates Lua code of the tree, returned as a string or streamed into `out`.
+		`generator` is created with options of the translator if it's not given.
+		"""
+		if generator is None:
+			generator = Generator(**self.options)
+		with phase(profile, "generation"):
+			result = generator.generate(tree, out)
+		if profile is not None:
+			profile.count("lines", len(generator.line_map))
+		return result
+
+	def translate(self, code, out=None, profile=None):
+		"""
+		Translates python code into Lua. Result is returned as a string, or streamed into `out` if it's set.
+		Time of every phase and sizes of intermediate results are recorded into `profile` (`profiler.Profile`) if it's set.
+		Results are taken from the cache of the translator if it's set, unless the translation is profiled.
+		"""
+		if self.cache is None or profile is not None:
+			return self.generate(self.build_tree(code, profile), out, profile)
+		key = self.cache.key(code, self.fingerprint)
+		found, result = self.cache.get(key)
+		if not found:
+			try:
+				result = self.generate(self.build_tree(code))
+			except AnalyzerError as e:
+				result = e
+			self.cache.put(key, result)
+		if isinstance(result, AnalyzerError):
+			raise result.with_traceback(None)
+		if out is None:
+			return result
+		out.write(result)
+
+	def stream(self, code, profile=None, generator=None):
+		"""
+		Translates code statement by statement: every top-level statement is parsed, checked with names declared
+		by the statements before it, optimized and generated, and its Lua code is yielded before the next one is parsed.
+		Joined parts are the same as the result of `translate`, unless a variable is assigned values of different kinds
+		(e.g. a string and a number), which is known only after the whole program is read.
+		Statements with functions which use global variables assigned after them are held back (see `Generator.generate_part`)
+		and yielded together with the statement which assigns the variables.
+		Memory is used only by the statements being translated or held back. Code of the statements before an error
+		is yielded before the error is raised, unless it's held back.
+		Tree-shaking and options which need the whole program raise `ValueError`.
+		"""
+		if self.shake:
+			raise ValueError("Tree-shaking needs the whole program")
+		if generator is None:
+			generator = Generator(**self.options)
+		generator.begin()
+		semantics = SemanticAnalyzer()
+		counters = dict.fromkeys(["tokens", "states", "nodes"], 0)
+		for tokens in split_statements(self.lexer.scan(code)):
+			with phase(profile, "recognition"):
+				parser = EarleyParser(tokens, self.grammar)
+				parser.recognize()
+			with phase(profile, "tree"):
+				tree = parser._get()
+			if profile is not None:
+				counters["tokens"] += len(tokens)
+				counters["states"] += sum(len(entry) for entry in parser.chart.entries)
+				counters["nodes"] += sum(1 for _ in walk(tree))
+				for name, value in counters.items():
+					profile.count(name, value)
+			# chart of the statement isn't needed anymore
+			del parser
+			if self.safe:
+				with phase(profile, "semantics"):
+					semantics.check_part(tree)
+			if self.optimize:
+				with phase(profile, "optimization"):
+					Optimizer().optimize(tree)
+			with phase(profile, "generation"):
+				generator.generate_part(tree)
+			if profile is not None:
+				profile.count("lines", len(generator.line_map))
+			part = generator.sink.take()
+			if len(part) > 0:
+				yield part
+		generator.end()
+		part = generator.sink.take()
+		if len(part) > 0:
+			yield part
+
+	def translate_all(self, codes, jobs=None) -> list:
+		"""
+		Translates list of codes by a pool of `jobs` threads. Results are returned in the same order,
+		code which can't be translated gets its exception (`AnalyzerError`) instead of Lua code.
+		"""
+		def run(code):
+			try:
+				return self.translate(code)
+			except AnalyzerError as e:
+				return e
+		with ThreadPoolExecutor(max_workers=jobs) as executor:
+			return list(executor.map(run, codes))
+
+
+def build_tree(code, safe=True, optimize=False, shake=False, exports=()):
+	return Translator(safe, optimize, shake, exports).build_tree(code)
+
+
+def translate(code, safe=True, out=None, optimize=False, shake=False, exports=(), profile=None, cache=None,
+			  **options):
+	"""
+	Translates python code into Lua. Result is returned as a string,
+	or streamed into `out` (e.g. opened text file) if it's set.
+	`optimize` folds constant expressions and removes unreachable branches before generation.
+	`shake` removes functions which are never used by the top-level code, except for names in `exports`.
+	`profile` (`profiler.Profile`) gets time of every phase of translation.
+	`cache` (`cache.TranslationCache`) keeps results, so the same code with the same options is translated once.
+	`options` are passed to the `Generator` (e.g. `local_variables=True`).
+	It's safe to call from several threads at once.
+	"""
+	return Translator(safe, optimize, shake, exports, cache=cache, **options).translate(code, out, profile)
+
+
+def translate_stream(code, safe=True, optimize=False, profile=None, **options):
+	"""
+	Translates python code into Lua statement by statement, yielding Lua code of every top-level statement
+	as soon as it's generated (see `Translator.stream`).
+	"""
+	return Translator(safe, optimize, **options).stream(code, profile)
+
+
+async def translate_async(code, safe=True, optimize=False, shake=False, exports=(), executor=None, timeout=None,
+						  **options):
+	"""
+	Translates python code into Lua in `executor` (thread or process pool, default executor of the event loop if None),
+	so the event loop isn't blocked. Raises `asyncio.TimeoutError` if translation takes more than `timeout` seconds.
+	Translation which is already running can't be interrupted: on timeout or cancellation it's finished in background
+	and its result is dropped.
+	"""
+	loop = asyncio.get_running_loop()
+	call = functools.partial(translate, code, safe, None, optimize, shake, exports, **options)
+	return await asyncio.wait_for(loop.run_in_executor(executor, call), timeout)
+
+
+async def translate_many(codes, limit=4, executor=None, timeout=None, **arguments):
+	"""
+	Translates pairs of name and code (e.g. `dict.items()`) with at most `limit` translations running at a time.
+	Yields name and Lua code for every file as soon as it's translated, or name and exception if translation failed
+	(`AnalyzerError`) or took more than `timeout` seconds (`asyncio.TimeoutError`).
+	Translations which aren't finished are cancelled when the generator is closed.
+	"""
+	semaphore = asyncio.Semaphore(limit)
+
+	async def run(name, code):
+		async with semaphore:
+			try:
+				return name, await translate_async(code, executor=executor, timeout=timeout, **arguments)
+			except (AnalyzerError, asyncio.TimeoutError) as e:
+				return name, e
+
+	tasks = [asyncio.ensure_future(run(name, code)) for name, code in codes]
+	try:
+		for task in asyncio.as_completed(tasks):
+			yield await task
+	finally:
+		for task in tasks:
+			task.cancel()
 
 
 def main():
-	args = sys.argv
-	args.pop(0)
-	input = None
-	output = None
-	safe = True
-	help = len(args) > 0
-	while len(args) > 0:
-		arg = args.pop(0)
-		if arg == "-i":
-			if len(args) > 0:
-				input = args.pop(0)
-				help = False
-		elif arg == "-o":
-			if len(args) > 0:
-				output = args.pop(0)
-				help = False
-		elif arg == "-unsafe":
-			safe = False
-			help = False
-		else:
-			break
-	
-	if help:
+	arguments = parse_arguments(sys.argv[1:])
+	if arguments is None:
 		show_help()
+		return
+	input, output, watching, settings = arguments
+	if watching:
+		watch(input, output, **settings)
 	else:
-		if input is None:
-			input = "./input"
-		if output is None:
-			output = "./output"
-		process(input, output, safe)
-
-
-def show_help():
-	print("Help:")
-	print("  -i <path> - path to input file or directory. Default: `./input`")
-	print("  -o <path> - path to output directory. Default: `./output`")
+		process(input, output, **settings)
 
 
-def process(input, output, safe=True):
+def process(input, output, safe=True, optimize=False, shake=False, exports=(), jobs=1, profile=False, pstats=0,
+			**options):
+	"""
+	Translates python file or all python files of the directory into `output` directory.
+	With `jobs` > 1 files are translated by a pool of processes, biggest files go first,
+	and the report is still printed in the order of files.
+	Files translated by the previous run with the same sources, grammar, version and options are skipped,
+	outputs of removed files are deleted.
+	With `profile` all files are translated, and time of every phase is reported and saved into `PROFILE` file
+	of the output directory. `pstats` slowest files are translated again with `cProfile`,
+	and its statistics are saved into `profile` directory of the output.
+	"""
 	print("Translation started")
 	print("Looking for .py files in {} dir".format(input))
-	files = []
-	if os.path.isdir(input):
-		files = [(join(dirpath, file), file) for dirpath, _, filenames in os.walk(input) for file in filenames if isfile(join(dirpath, file)) and file.endswith(".py")]
-	elif os.path.isfile(input):
-		files.append(input)
-	else:
+	files = find_files(input)
+	if files is None:
 		print("Error: input file/dir not found")
 		print()
 		show_help()
@@ -80,26 +289,299 @@ def process(input, output, safe=True):
 	for _, filename in files:
 		print("  -", filename)
 	print()
-	for path, filename in files:
-		print("Processing file:", filename)
-		py_code = open(path, "r").read()
-		error = None
+	settings = (output, safe, optimize, shake, tuple(exports), options)
+	results = build(files, output, settings, jobs, scope=input, profile=profile or pstats > 0)
+	if profile or pstats > 0:
+		records = {filename: results[path][4] for path, filename in files if results[path][1] is None}
+		print("Profile (ms):")
+		print(format_report(records))
+		with atomic_open(os.path.join(output, PROFILE)) as file:
+			json.dump({"files": records, "total": aggregate(records)}, file, indent=1)
+		slowest = sorted(files, key=lambda file: -records.get(file[1], {"total": -1})["total"])[:pstats]
+		for path, filename in slowest:
+			if filename in records:
+				print("Statistics of phases:", ", ".join(profile_calls(path, filename, *settings)))
+
+
+def watch(input, output, safe=True, optimize=False, shake=False, exports=(), jobs=1, interval=0.5, stop=None,
+		  **options):
+	"""
+	Translates files like `process` does, and then keeps translating the files which are changed,
+	until it's interrupted or `stop` (`threading.Event`) is set.
+	Changes are found by polling sizes and modification times of files every `interval` seconds.
+	"""
+	process(input, output, safe, optimize, shake, exports, jobs, **options)
+	settings = (output, safe, optimize, shake, tuple(exports), options)
+	state = snapshot(find_files(input) or [])
+	print("Watching {} for changes".format(input))
+	# workers are started once, so translation of changed files doesn't wait for them to load
+	executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) if jobs > 1 else None
+	try:
+		while stop is None or not stop.is_set():
+			time.sleep(interval)
+			files = find_files(input)
+			if files is None or snapshot(files) == state:
+				continue
+			# editors and version control write files in several steps, so translation waits until they are done
+			current = snapshot(files)
+			while True:
+				time.sleep(interval)
+				files = find_files(input)
+				latest = snapshot(files or [])
+				if latest == current:
+					break
+				current = latest
+			if files is None:
+				continue
+			unchanged = {path for path, stat in current.items() if state.get(path) == stat}
+			build(files, output, settings, jobs, executor, unchanged, input)
+			state = current
+	except KeyboardInterrupt:
+		print("Watching stopped")
+	finally:
+		if executor is not None:
+			executor.shutdown()
+
+
+def find_files(input):
+	"""Python files of the directory (or the file itself) as pairs of path and name, None if input doesn't exist."""
+	if os.path.isdir(input):
+		return [(join(dirpath, file), file) for dirpath, _, filenames in os.walk(input) for file in filenames if isfile(join(dirpath, file)) and file.endswith(".py")]
+	elif os.path.isfile(input):
+		return [(input, os.path.basename(input))]
+	return None
+
+
+def snapshot(files):
+	state = {}
+	for path, _ in files:
 		try:
-			lua_code = translate(py_code, safe)
-		except AnalyzerError as e:
-			error = e
-		
-		if not os.path.exists(output):
-			os.mkdir(output)
-		print("Status:", "SUCCESS" if error is None else "ERROR")
-		if error is None:
-			filename = "{}/".format(output) + filename[:-2] + "lua"
-			print("Lua code was saved to:", filename)
-			open(filename, "w").write(lua_code)
+			stat = os.stat(path)
+		except OSError:
+			continue
+		state[path] = (stat.st_mtime_ns, stat.st_size)
+	return state
+
+
+def build(files, output, settings, jobs=1, executor=None, unchanged=None, scope=None, profile=False):
+	"""
+	Translates files which aren't translated into `output` yet (according to the manifest) and reports them.
+	Paths in `unchanged` are known to be the same as in the previous build, so they aren't read again,
+	and only changed files are reported if it's set.
+	Outputs of files from the manifest which are in `scope` (input file or directory), but not in `files`, are removed.
+	Errors of translation are kept in the manifest as well, so files which can't be translated are skipped
+	until they are changed. Outputs are named after the files only, so files with the same name
+	(e.g. in different subdirectories) are errors, and none of them is written.
+	With `profile` every file is translated and profiled.
+	Returns results of `process_file` by path of the file.
+	"""
+	if not os.path.exists(output):
+		os.makedirs(output)
+	key = build_hash(settings[1:])
+	manifest = read_manifest(output)
+	entries = {}
+	results = {}
+	pending = []
+	sources = {}
+	for path, filename in files:
+		sources.setdefault(filename, []).append(path)
+	for path, filename in files:
+		if len(sources[filename]) > 1:
+			error = "Output {} is written by several files: {}".format(filename[:-2] + "lua", ", ".join(sources[filename]))
+			results[path] = (None, error, False, [], None)
+			continue
+		entry = manifest.get(os.path.abspath(path))
+		known = unchanged is not None and path in unchanged and entry is not None
+		source = entry["source"] if known else file_hash(path)
+		if (not profile and entry is not None and entry["source"] == source and entry["build"] == key and
+				all(os.path.exists(os.path.join(output, name)) for name in entry["outputs"])):
+			entries[path] = entry
+			if "error" in entry:
+				results[path] = (None, entry["error"], True, [], None)
+			else:
+				results[path] = (os.path.join(output, entry["outputs"][0]), None, True)
 		else:
-			print("Description:", error)
-			print("File skipped")
-		print()
+			entries[path] = {"source": source, "build": key, "outputs": []}
+			pending.append((path, filename))
+	
+	if len(pending) > 1 and (jobs > 1 or executor is not None):
+		pool = executor or ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+		try:
+			# the longest translations are started first, so they don't end up running alone at the end
+			order = sorted(pending, key=lambda file: os.path.getsize(file[0]), reverse=True)
+			futures = {file: pool.submit(process_file, *file, *settings, profile) for file in order}
+			for path, filename in files:
+				if (path, filename) in futures:
+					results[path] = futures[(path, filename)].result()
+				if unchanged is None or not results[path][2]:
+					report(filename, *results[path])
+		finally:
+			if executor is None:
+				pool.shutdown()
+	else:
+		for path, filename in files:
+			if path not in results:
+				results[path] = process_file(path, filename, *settings, profile)
+			if unchanged is None or not results[path][2]:
+				report(filename, *results[path])
+	
+	for path, filename in pending:
+		entries[path]["outputs"] = results[path][3]
+		if results[path][1] is not None:
+			entries[path]["error"] = results[path][1]
+	covered = {os.path.abspath(path) for path, _ in files}
+	entries = {os.path.abspath(path): entry for path, entry in entries.items()
+			   if len(entry["outputs"]) > 0 or "error" in entry}
+	# manifest is read again to keep files of other builds which write into the same directory
+	manifest = read_manifest(output)
+	scope = os.path.abspath(scope) if scope is not None else None
+	stale = {path for path in manifest if path in covered or
+			 scope is not None and (path == scope or path.startswith(os.path.join(scope, "")))}
+	entries.update((path, entry) for path, entry in manifest.items() if path not in stale)
+	# outputs of removed files, of files which can't be translated anymore, and of disabled options
+	written = {name for entry in entries.values() for name in entry["outputs"]}
+	remove_outputs(output, {name for path in stale for name in manifest[path]["outputs"]} - written)
+	write_manifest(output, entries)
+	return results
+
+
+def init_worker():
+	"""
+	Prepares process of the pool: grammar is loaded once, when this module is imported by the worker,
+	and interruption is left to the main process, which stops the pool.
+	"""
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def process_file(path, filename, output, safe, optimize, shake, exports, options, profile=False):
+	"""
+	Translates one file. Returns path to Lua code, description of the error (if translation failed),
+	False (file is not skipped), names of written files and profile of translation (if `profile` is set).
+	"""
+	with open(path, "r") as py_file:
+		py_code = py_file.read()
+	translator = Translator(safe, optimize, shake, exports, **options)
+	record = Profile() if profile else None
+	try:
+		tree = translator.build_tree(py_code, record)
+	except AnalyzerError as e:
+		return None, str(e), False, [], None
+	
+	filename = "{}/".format(output) + filename[:-2] + "lua"
+	generator = Generator(**options)
+	with atomic_open(filename) as lua_file:
+		translator.generate(tree, lua_file, record, generator)
+	outputs = [os.path.basename(filename)]
+	if generator.compact:
+		write_line_map(filename + ".lines", generator.line_map)
+		outputs.append(outputs[0] + ".lines")
+	if generator.source_map:
+		source = os.path.relpath(path, os.path.dirname(filename))
+		with atomic_open(filename + ".map") as map_file:
+			json.dump(generator.build_source_map(os.path.basename(filename), source), map_file)
+		outputs.append(outputs[0] + ".map")
+	return filename, None, False, outputs, record.as_dict() if record is not None else None
+
+
+def profile_calls(path, filename, output, safe, optimize, shake, exports, options):
+	"""Translates file with `cProfile` running for every phase. Returns paths to saved statistics."""
+	with open(path, "r") as py_file:
+		py_code = py_file.read()
+	record = Profile(calls=True)
+	Translator(safe, optimize, shake, exports, **options).translate(py_code, profile=record)
+	directory = os.path.join(output, "profile")
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	return record.dump_stats(os.path.join(directory, filename[:-3]))
+
+
+def report(filename, lua_filename, error, skipped, *_):
+	print("Processing file:", filename)
+	if error is not None:
+		print("Status: ERROR")
+	elif skipped:
+		print("Status: UP TO DATE")
+	else:
+		print("Status: SUCCESS")
+	if error is None:
+		print("Lua code was saved to:", lua_filename)
+	else:
+		print("Description:", error)
+		print("File skipped")
+	print()
+
+
+@contextmanager
+def atomic_open(filename):
+	"""Opens temporary file for writing, which replaces `filename` only when it's completely written."""
+	# name is unique for the process, so workers of the pool never write into the same file
+	temporary = os.path.join(os.path.dirname(filename), ".{}.{}.tmp".format(os.path.basename(filename), os.getpid()))
+	try:
+		with open(temporary, "w") as file:
+			yield file
+		os.replace(temporary, filename)
+	except BaseException:
+		# temporary file may be not created yet (or already removed), the original error is raised anyway
+		with suppress(FileNotFoundError):
+			os.remove(temporary)
+		raise
+
+
+def file_hash(path):
+	digest = hashlib.sha256()
+	with open(path, "rb") as file:
+		for chunk in iter(lambda: file.read(1 << 16), b""):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def sources_hash():
+	"""Hash of the sources of the translator, so outputs are rebuilt when LuPy is changed without a new version."""
+	digest = hashlib.sha256()
+	for name in TRANSLATOR_MODULES:
+		digest.update(file_hash(sys.modules[name].__file__).encode())
+	digest.update(file_hash(__file__).encode())
+	return digest.hexdigest()
+
+
+def build_hash(settings):
+	"""
+	Hash of everything besides the source which changes the result:
+	grammar, version and sources of LuPy, and options.
+	"""
+	safe, optimize, shake, exports, options = settings
+	description = json.dumps([__version__, sources_hash(), safe, optimize, shake, sorted(exports),
+							  sorted(options.items())])
+	return file_hash(GRAMMAR_PATH) + hashlib.sha256(description.encode()).hexdigest()
+
+
+def read_manifest(output):
+	try:
+		with open(os.path.join(output, MANIFEST), "r") as file:
+			manifest = json.load(file)
+	except (OSError, ValueError):
+		return {}
+	if not isinstance(manifest, dict) or manifest.get("version") != __version__:
+		return {}
+	return manifest.get("files", {})
+
+
+def write_manifest(output, entries):
+	with atomic_open(os.path.join(output, MANIFEST)) as file:
+		json.dump({"version": __version__, "files": entries}, file, indent=1, sort_keys=True)
+
+
+def remove_outputs(output, names):
+	for name in names:
+		if os.path.exists(os.path.join(output, name)):
+			os.remove(os.path.join(output, name))
+
+
+def write_line_map(filename, line_map):
+	"""Writes number of the line of python code (starting from 1) for every line of Lua code."""
+	with atomic_open(filename) as file:
+		file.write("\n".join(str(line + 1) for line in line_map) + "\n")
 
 
 if __name__ == '__main__':
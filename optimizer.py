@@ -0,0 +1,452 @@
+import math
+
+from lexer import Token, TokenDivider, TokenKeyword, TokenNumber, TokenOperator, TokenString
+from parse import TreeToken, SyntaxTree
+from scopes import walk
+from visitor import Visitor, visits
+
+# priorities of binary operators in Lua, the translated expression is evaluated exactly as Lua would do it
+BINARY_PRIORITIES = {
+	"or": 1, "and": 2,
+	"<": 3, "<=": 3, ">": 3, ">=": 3, "==": 3, "!=": 3,
+	"+": 5, "-": 5,
+	"*": 6, "/": 6, "%": 6,
+	"**": 8,
+}
+UNARY_PRIORITY = 7
+MIN_INTEGER = -2 ** 63
+MAX_INTEGER = 2 ** 63 - 1
+
+
+class Unfoldable(Exception):
+	"""Expression can't be computed at translation time with the same result as at runtime."""
+
+
+def leaves(tree: SyntaxTree) -> list:
+	"""Tokens of the subtree in source order, without recursion."""
+	tokens = []
+	pending = [tree]
+	while pending:
+		node = pending.pop()
+		if isinstance(node, TreeToken):
+			tokens.append(node.token)
+		else:
+			pending.extend(reversed(node))
+	return tokens
+
+
+def is_number(value) -> bool:
+	# bool is a subclass of int in python, but not a number in Lua
+	return type(value) in (int, float)
+
+
+def kind(value) -> type:
+	return float if type(value) is int else type(value)
+
+
+def checked(value):
+	if type(value) is int and not MIN_INTEGER <= value <= MAX_INTEGER:
+		# Lua integers wrap around, and literals out of range become floats
+		raise Unfoldable()
+	if type(value) is float and not math.isfinite(value):
+		raise Unfoldable()
+	return value
+
+
+def literal_value(token: Token):
+	content = token.content
+	if isinstance(token, TokenNumber):
+		if content.lstrip("+-").isdigit():
+			return checked(int(content))
+		return checked(float(content))
+	if isinstance(token, TokenString):
+		value = content[1:-1]
+		if "\\" in value:
+			raise Unfoldable()
+		return value
+	if isinstance(token, TokenKeyword) and content in ("True", "False"):
+		return content == "True"
+	raise Unfoldable()
+
+
+def literal_content(value) -> str:
+	if type(value) is bool:
+		return "True" if value else "False"
+	if type(value) is str:
+		if '"' not in value:
+			return '"' + value + '"'
+		if "'" not in value:
+			return "'" + value + "'"
+		raise Unfoldable()
+	return repr(value)
+
+
+def literal_token(value, line: int, pos: int) -> Token:
+	content = literal_content(value)
+	if type(value) is bool:
+		return TokenKeyword(line, pos, content)
+	if type(value) is str:
+		return TokenString(line, pos, content)
+	return TokenNumber(line, pos, content)
+
+
+def compute(operator: str, left, right):
+	if operator == "and":
+		return right if left is not False else left
+	if operator == "or":
+		return left if left is not False else right
+	if operator in ("==", "!="):
+		equal = kind(left) == kind(right) and left == right
+		return equal if operator == "==" else not equal
+	if operator == "+" and type(left) is str and type(right) is str:
+		return left + right
+	if not is_number(left) or not is_number(right):
+		# strings are ordered by locale at runtime, other mixes are errors
+		raise Unfoldable()
+	if operator == "<":
+		return left < right
+	if operator == "<=":
+		return left <= right
+	if operator == ">":
+		return left > right
+	if operator == ">=":
+		return left >= right
+	try:
+		if operator == "+":
+			return checked(left + right)
+		if operator == "-":
+			return checked(left - right)
+		if operator == "*":
+			return checked(left * right)
+		if operator == "/":
+			return checked(left / right)
+		if operator == "%":
+			return checked(left % right)
+		# `^` always works on floats in Lua
+		result = float(left) ** float(right)
+	except (ZeroDivisionError, OverflowError):
+		raise Unfoldable()
+	if type(result) is not float:
+		raise Unfoldable()
+	return checked(result)
+
+
+class ConstantEvaluator:
+	"""Computes expression, which consists only of literals, with Lua priorities and semantics."""
+
+	def __init__(self, tokens: list):
+		self.tokens = tokens
+		self.index = 0
+
+	def evaluate(self):
+		value = self.expression(1)
+		if self.index != len(self.tokens):
+			raise Unfoldable()
+		return value
+
+	def peek(self):
+		if self.index < len(self.tokens):
+			token = self.tokens[self.index]
+			if isinstance(token, (TokenOperator, TokenDivider)):
+				return token.content
+		return None
+
+	def expression(self, priority: int):
+		if self.peek() == "not":
+			self.index += 1
+			value = self.expression(UNARY_PRIORITY) is False
+		else:
+			value = self.operand()
+		while True:
+			operator = self.peek()
+			operator_priority = BINARY_PRIORITIES.get(operator, 0)
+			if operator_priority < priority:
+				return value
+			self.index += 1
+			right_priority = operator_priority if operator == "**" else operator_priority + 1
+			value = compute(operator, value, self.expression(right_priority))
+
+	def operand(self):
+		if self.peek() == "(":
+			self.index += 1
+			value = self.expression(1)
+			if self.peek() != ")":
+				raise Unfoldable()
+			self.index += 1
+			return value
+		if self.index >= len(self.tokens):
+			raise Unfoldable()
+		token = self.tokens[self.index]
+		self.index += 1
+		return literal_value(token)
+
+
+def wrap(labels, token: Token) -> SyntaxTree:
+	"""Builds chain of single-child nodes with given labels (from the outer one) around the token."""
+	node = TreeToken(token)
+	for label in reversed(labels):
+		node = SyntaxTree(label, [node])
+	return node
+
+
+def detach(node: SyntaxTree) -> SyntaxTree:
+	parent = node.parent()
+	if parent is not None:
+		parent.pop(node.parent_index())
+	return node
+
+
+def constant_condition(expression: SyntaxTree):
+	"""Value of <boolean_expressions> node if it's a literal `True` or `False`, otherwise None."""
+	if len(expression) == 1 and isinstance(expression[0], SyntaxTree) and expression[0].label() == "<boolean>":
+		return expression[0].first_token.content == "True"
+	return None
+
+
+class Optimizer(Visitor):
+	"""
+	Simplifies syntax tree before generation: folds expressions over literals into a single literal
+	and removes branches of conditions and loops which are never executed.
+
+	Expressions are computed the way generated Lua code computes them, so optimization never changes
+	the result of the program; anything that could behave differently (integer overflow, division by zero,
+	comparison of strings) is left for runtime.
+	Tree keeps the layout of the source: folded literals take place of the expression, following tokens of
+	the line are moved to keep spacing, and removed statements leave empty lines.
+	"""
+
+	def __init__(self):
+		self.tokens = []
+		self.index = {}
+		self.lines = {}
+
+	def optimize(self, tree: SyntaxTree) -> SyntaxTree:
+		nodes = list(walk(tree))
+		self.tokens = leaves(tree)
+		self.index = {token: i for i, token in enumerate(self.tokens)}
+		self.lines = {}
+		for i, token in enumerate(self.tokens):
+			self.lines.setdefault(token.line, []).append(i)
+		# children are simplified before their parents, so folding goes from inner expressions to outer ones
+		for node in reversed(nodes):
+			node.update_span()
+			self.visit(node)
+		return tree
+
+	def visit_default(self, node: SyntaxTree):
+		pass
+
+	@visits("<mathematical_expressions>")
+	def fold_mathematical_expressions(self, tree: SyntaxTree):
+		if self.follows_not(tree):
+			return
+		value = self.evaluate(tree)
+		if value is not None:
+			self.fold(tree[0], value, ["<first_priority>", "<second_priority>", "<third_priority>", "<fourth_priority>", "<Number>"])
+
+	@visits("<second_priority>", "<third_priority>")
+	def fold_operation(self, tree: SyntaxTree):
+		# only the whole chain of operations with the same priority is an expression on its own
+		if tree.parent().label() == tree.label() or self.follows_not(tree):
+			return
+		value = self.evaluate(tree)
+		if value is not None:
+			labels = ["<second_priority>", "<third_priority>", "<fourth_priority>", "<Number>"]
+			self.fold(tree, value, labels[labels.index(tree.label()):])
+
+	@visits("<fourth_priority>")
+	def fold_parentheses(self, tree: SyntaxTree):
+		if len(tree) == 1 or self.follows_not(tree):
+			return
+		value = self.evaluate(tree)
+		if not is_number(value):
+			return
+		if value < 0:
+			# unary minus has lower priority than `^` in Lua, so negative values keep their parentheses
+			self.fold(tree[1], value, ["<first_priority>", "<second_priority>", "<third_priority>", "<fourth_priority>", "<Number>"])
+		else:
+			self.fold(tree, value, ["<fourth_priority>", "<Number>"])
+
+	@visits("<comparison_expressions>")
+	def fold_comparison_expressions(self, tree: SyntaxTree):
+		previous = self.neighbour(tree.first_token, -1)
+		following = self.neighbour(tree.last_token, 1)
+		# `not` and other comparisons bind to the operands in Lua, then comparison isn't an expression on its own
+		if any(token is not None and BINARY_PRIORITIES.get(token.content) == 3 for token in (previous, following)):
+			return
+		if self.follows_not(tree):
+			return
+		value = self.evaluate(tree)
+		if type(value) is bool:
+			self.fold(tree, value, ["<boolean>"])
+
+	@visits("<boolean_expressions>")
+	def fold_boolean_expressions(self, tree: SyntaxTree):
+		if tree.parent().label() == "<boolean_expressions>":
+			return
+		value = self.evaluate(tree)
+		if type(value) is bool:
+			self.fold(tree[0] if len(tree) == 1 else tree, value, ["<boolean>"] if len(tree) == 1 else ["<boolean_expressions>", "<boolean>"])
+
+	@visits("<String_expressions>")
+	def fold_string_expressions(self, tree: SyntaxTree):
+		if tree.parent().label() == "<String_expressions>":
+			return
+		value = self.evaluate(tree)
+		if type(value) is str:
+			self.fold(tree, value, ["<String_expressions>", "<String>"])
+
+	@visits("<sentence>")
+	def eliminate_dead_code(self, sentence: SyntaxTree):
+		internal = sentence[0]
+		if internal.label() != "<complex_sentence>":
+			return
+		statement = internal[0]
+		if statement.label() == "<condition>":
+			self.eliminate_branches(sentence, statement)
+		elif statement[0].label() == "<while_loop>" and constant_condition(statement[0][1]) is False:
+			self.remove(sentence)
+
+	def eliminate_branches(self, sentence: SyntaxTree, condition: SyntaxTree):
+		if_token = condition[0].token
+		conditional = condition[1]
+		value = constant_condition(conditional[0])
+		while value is not None:
+			if value:
+				self.inline(sentence, conditional[2], if_token)
+				return
+			if len(conditional) == 3:
+				self.remove(sentence)
+				return
+			otherwise = conditional[3]
+			if len(otherwise) == 3:
+				self.inline(sentence, otherwise[2], if_token)
+				return
+			# the first `elif` becomes `if` of the statement
+			elif_token = otherwise[0].token
+			if_token = TokenKeyword(elif_token.line, elif_token.pos, "if")
+			self.shift(elif_token, len(elif_token.content) - len(if_token.content))
+			conditional = detach(otherwise[1])
+			condition[0] = TreeToken(if_token)
+			condition[1] = conditional
+			value = constant_condition(conditional[0])
+
+		while len(conditional) > 3 and len(conditional[3]) == 2:
+			otherwise = conditional[3]
+			branch = otherwise[1]
+			value = constant_condition(branch[0])
+			if value is None:
+				conditional = branch
+			elif value:
+				# the rest of branches is never reached, so this one becomes `else`
+				elif_token = otherwise[0].token
+				else_token = TokenKeyword(elif_token.line, elif_token.pos, "else")
+				otherwise[0] = TreeToken(else_token)
+				colon, block = branch.pop(1), detach(branch[1])
+				self.shift(elif_token, colon.token.pos - else_token.pos - len(else_token.content))
+				otherwise[1] = colon
+				otherwise.append(block)
+			elif len(branch) > 3:
+				conditional[3] = detach(branch[3])
+			else:
+				del conditional[3]
+		# spans of all edited conditionals are updated from the innermost one
+		self.update_spans(conditional)
+
+	def inline(self, sentence: SyntaxTree, block: SyntaxTree, if_token: Token):
+		"""Replaces the statement with the body of the branch, moved to the indentation of the statement."""
+		if len(block) == 1:
+			body = block[0]
+			indentation = body.first_token.pos
+		else:
+			body = block[2]
+			indentation = block[1].token.pos
+		for token in leaves(body):
+			token.pos -= indentation - if_token.pos
+		sentence[0] = detach(body)
+		sentence.update_span()
+
+	def remove(self, sentence: SyntaxTree):
+		first = sentence.first_token
+		sentence[0] = wrap(["<simple_sentence>"], TokenDivider(first.line, first.pos, "newline"))
+		sentence.update_span()
+
+	def evaluate(self, tree: SyntaxTree):
+		"""Value of the expression, or None if it's not a constant."""
+		if tree.leaf_count < 2:
+			return None
+		try:
+			return ConstantEvaluator(leaves(tree)).evaluate()
+		except Unfoldable:
+			return None
+
+	def fold(self, tree: SyntaxTree, value, labels: list):
+		"""Replaces the expression with a literal of its value."""
+		first, last = tree.first_token, tree.last_token
+		previous = self.neighbour(first, -1)
+		try:
+			token = literal_token(value, first.line, first.pos)
+		except Unfoldable:
+			return
+		if token.content.startswith("-") and previous is not None and previous.content == "-":
+			# `--` starts a comment in Lua
+			return
+		start, end = self.index[first], self.index[last]
+		for i in range(start + 1, end + 1):
+			self.tokens[i] = None
+		self.tokens[start] = token
+		self.index[token] = start
+		self.shift(last, last.pos + len(last.content) - first.pos - len(token.content))
+
+		parent = tree.parent()
+		parent[tree.parent_index()] = wrap(labels, token)
+		parent.update_span()
+
+	def update_spans(self, node: SyntaxTree):
+		"""Updates spans of the edited node and its parents up to the statement which contains it."""
+		node.update_span()
+		while node.label() != "<sentence>":
+			node = node.parent()
+			node.update_span()
+
+	def shift(self, token: Token, distance: int):
+		"""Moves tokens of the line which follow the token to the left."""
+		if distance == 0:
+			return
+		for i in self.lines.get(token.line, []):
+			following = self.tokens[i]
+			if following is not None and following.pos > token.pos:
+				following.pos -= distance
+
+	def follows_not(self, tree: SyntaxTree) -> bool:
+		"""
+		Tells whether the expression is preceded by `not`, which binds tighter than arithmetic and comparisons in Lua,
+		so `not` is applied to its first operand rather than to the expression.
+		"""
+		previous = self.neighbour(tree.first_token, -1)
+		return previous is not None and previous.content == "not"
+
+	def neighbour(self, token: Token, step: int):
+		i = self.index[token] + step
+		while 0 <= i < len(self.tokens) and self.tokens[i] is None:
+			i += step
+		return self.tokens[i] if 0 <= i < len(self.tokens) else None
+
+
+def remove_functions(tree: SyntaxTree, reachable: set) -> list:
+	"""
+	Tree-shaking: replaces definitions of functions which are not in `reachable` with empty lines.
+	Returns names of removed functions.
+	"""
+	removed = []
+	programs = [node for node in walk(tree) if node.label() == "<program>"]
+	for program in programs:
+		function = program[0]
+		if function.label() == "<function>" and function[1].first_token.content not in reachable:
+			removed.append(function[1].first_token.content)
+			def_token = function.first_token
+			program[0] = wrap(["<sentence>", "<simple_sentence>"], TokenDivider(def_token.line, def_token.pos, "newline"))
+	# nested programs go after their parents, spans are updated from the innermost one
+	for program in reversed(programs):
+		program.update_span()
+	return removed
@@ -72,12 +72,12 @@ function bar7(a)
 end
 
 function another() 
-    for i in pairs({[0] = 1, [1] = 2, [2] = 3}) do
+    for _, i in ipairs({1, 2, 3}) do
         print(i)
     end
 end
 
-print("hello" + "world")
+print("hello" .. "world")
 e = #(test(1, 2, 3, 4))
 a = {test=1, t=2}
 b = {[0] = 1, [1] = 2}
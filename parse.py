@@ -1,8 +1,14 @@
 from collections import defaultdict
-from nltk.tree import Tree
+import hashlib
+from nltk.tree import ParentedTree
 import re
+import sys
 
-from errors import SyntacticError, NoNewLineError
+from errors import Diagnostic, SyntacticError, NoNewLineError
+
+GRAMMAR_PATH = "grammar/grammar.txt"
+# words after which a new line of code starts, parsing continues from them after a syntax error
+SYNCHRONIZATION = frozenset(["newline", "indent", "dedent"])
 
 
 class Rule(object):
@@ -31,7 +37,8 @@ class Rule(object):
 
 
 class Grammar(object):
-	def __init__(self, filepath="grammar/grammar.txt"):
+	"""Rules of the grammar. It's never changed after loading, so one instance is shared by parsers of all threads."""
+	def __init__(self, filepath=GRAMMAR_PATH):
 		self.rules = defaultdict(list)
 		with open(filepath, "r") as f:
 			for line in f:
@@ -42,9 +49,14 @@ class Grammar(object):
 
 				line = line.split('#')[0]
 				entries = line.split('->')
-				lhs = entries[0].strip()
+				# symbols become tree labels, interning makes label lookups in dispatch tables pointer comparisons
+				lhs = sys.intern(entries[0].strip())
 				for rhs in entries[1].split('|'):
-					self.add(Rule(lhs, rhs.strip().split()))
+					self.add(Rule(lhs, [sys.intern(symbol) for symbol in rhs.strip().split()]))
+		# lookups of terminals must not add them to the rules, as defaultdict would do
+		self.rules = {lhs: tuple(rules) for lhs, rules in self.rules.items()}
+		# identifies the rules, e.g. for caches of translations
+		self.fingerprint = hashlib.sha256(str(self).encode()).hexdigest()
 
 	def add(self, rule):
 		self.rules[rule.lhs].append(rule)
@@ -64,14 +76,14 @@ class Grammar(object):
 		return '\n'.join(s)
 
 	def __getitem__(self, nt):
-		return self.rules[nt]
+		return self.rules.get(nt, ())
 
 	def is_terminal(self, sym):
-		return len(self.rules[sym]) == 0
+		return sym not in self.rules
 
 	def is_tag(self, sym):
 		if not self.is_terminal(sym):
-			return all(self.is_terminal(s) for r in self.rules[sym] for s in r.rhs)
+			return all(self.is_terminal(s) for r in self[sym] for s in r.rhs)
 
 		return False
 
@@ -116,23 +128,37 @@ class EarleyState(object):
 		return len(self) == self.dot
 	
 	def get_helper(self, tokens):
-		children = []
-		for s in self.rule.rhs:
+		"""
+		Builds the tree of this state, taking leaves from `tokens` in order.
+		Back pointers are followed with explicit stack, so depth of the tree is not limited by recursion.
+		"""
+		position = 0
+		# frame: state, index of the next symbol of its rule, built children, unused back pointers
+		stack = [[self, 0, [], list(self.back_pointers)]]
+		while True:
+			frame = stack[-1]
+			state, index, children, pointers = frame
+			if index == len(state.rule.rhs):
+				stack.pop()
+				node = SyntaxTree(state.rule.lhs, children)
+				if len(stack) == 0:
+					return node
+				stack[-1][2].append(node)
+				continue
+			
+			s = state.rule.rhs[index]
+			frame[1] += 1
 			pointer = None
-			index = -1
-			for i in range(len(self.back_pointers)):
-				p = self.back_pointers[i]
-				if p.rule.lhs == s:
-					pointer = p
-					index = i
+			for i in range(len(pointers)):
+				if pointers[i].rule.lhs == s:
+					pointer = pointers.pop(i)
 					break
 			if pointer is None:
-				token = TreeToken(tokens.pop(0))
-				children.append(token if not s.startswith("<") else Tree(s, [token]))
+				token = TreeToken(tokens[position])
+				position += 1
+				children.append(token if not s.startswith("<") else SyntaxTree(s, [token]))
 			else:
-				self.back_pointers.pop(index)
-				children.append(pointer.get_helper(tokens))
-		return Tree(self.rule.lhs, children)
+				stack.append([pointer, 0, [], list(pointer.back_pointers)])
 
 
 class ChartEntry(object):
@@ -181,8 +207,37 @@ class TreeToken:
 		return self.token.content
 
 
+class SyntaxTree(ParentedTree):
+	"""
+	Parented tree that knows the span of its leaves: first and last token and the amount of leaves.
+	Span is computed from children when the node is created, so it never requires walking the subtree.
+	"""
+	def __init__(self, node, children=None):
+		super().__init__(node, children)
+		self.update_span()
+
+	def update_span(self):
+		self.first_token = None
+		self.last_token = None
+		self.leaf_count = 0
+		for child in self:
+			if isinstance(child, SyntaxTree):
+				if child.leaf_count == 0:
+					continue
+				first, last, count = child.first_token, child.last_token, child.leaf_count
+			else:
+				first, last, count = child.token, child.token, 1
+			if self.first_token is None:
+				self.first_token = first
+			self.last_token = last
+			self.leaf_count += count
+
+
+DEFAULT_GRAMMAR = Grammar()
+
+
 class EarleyParser(object):
-	def __init__(self, tokens, grammar=Grammar()):
+	def __init__(self, tokens, grammar=DEFAULT_GRAMMAR):
 		self.tokens = tokens.copy()
 		self.check_newline()
 		sentence = ""
@@ -230,7 +285,18 @@ class EarleyParser(object):
 												back_pointers=(prev_state.back_pointers + [state])))
 
 	def parse(self):
-		for i in range(len(self.words) + 1):
+		self.recognize()
+		return self._get()
+
+	def recognize(self):
+		"""
+		Fills the chart with states of the Earley algorithm, tree is built from them by `_get`.
+		Syntax errors are recorded into `diagnostics`, and recognition continues after the statement with the error,
+		so all errors of the code are found in one run.
+		"""
+		self.diagnostics = []
+		i = 0
+		while i <= len(self.words):
 			for state in self.chart[i]:
 				if not state.is_complete():
 					is_terminal = self.grammar.is_terminal(state.next())
@@ -240,12 +306,80 @@ class EarleyParser(object):
 						self.predictor(state, i)
 				else:
 					self.completer(state, i)
-
-		return self._get()
+			if i < len(self.words) and len(self.chart[i + 1]) == 0:
+				i = self.recover(i)
+			else:
+				i += 1
+
+	def expected(self, pos) -> list:
+		"""Terminals which states at the position of the chart can take."""
+		return sorted({state.next() for state in self.chart[pos]
+					   if not state.is_complete() and self.grammar.is_terminal(state.next())})
+
+	def recover(self, pos) -> int:
+		"""
+		Records the error at the word which no state can take, and skips the rest of its statement
+		(until the end of line, and the block after it): states which expected a sentence at the start
+		of the line are moved past the statement, as if it was parsed. Returns position where recognition continues.
+		"""
+		token = self.tokens[pos]
+		self.diagnostics.append(Diagnostic(token.line + 1, token.pos + 1, token.content, self.expected(pos)))
+		end = pos
+		while end < len(self.words) - 1 and self.words[end] != "newline":
+			end += 1
+		if end + 1 < len(self.words) and self.words[end + 1] == "indent":
+			depth = 0
+			for end in range(end + 1, len(self.words)):
+				depth += {"indent": 1, "dedent": -1}.get(self.words[end], 0)
+				if depth == 0:
+					break
+		resume = end + 1
+		# start of the line, or of an outer line if the statement can't be a sentence there
+		start = pos
+		while True:
+			if start == 0 or self.words[start - 1] in SYNCHRONIZATION:
+				states = [state for state in self.chart[start] if state.next() == "<sentence>"]
+				if len(states) > 0:
+					break
+			start -= 1
+		for state in states:
+			self.chart[resume].add(EarleyState(state.rule, dot=state.dot + 1, sent_pos=state.chart_pos,
+											   chart_pos=state.chart_pos, back_pointers=state.back_pointers))
+		return resume
 
 	def _get(self):
-		for state in self.chart[-1]:
-			if state.is_complete() and state.rule.lhs == 'S':
-				return state.get_helper(self.tokens)
-
-		raise SyntacticError
+		if len(self.diagnostics) == 0:
+			for state in self.chart[-1]:
+				if state.is_complete() and state.rule.lhs == 'S':
+					return state.get_helper(self.tokens)
+			# code ends before some statement does
+			token = self.tokens[-1]
+			self.diagnostics.append(Diagnostic(token.line + 1, token.pos + 1, "end of file", self.expected(len(self.words))))
+
+		raise SyntacticError(self.diagnostics)
+
+
+# tokens which continue the top-level statement before them
+CONTINUATIONS = frozenset(["newline", "indent", "dedent", "elif", "else"])
+
+
+def split_statements(tokens):
+	"""
+	Splits stream of tokens into lists of tokens of top-level statements (with empty lines after them).
+	Every list is a program of its own, and they are yielded as soon as the statement ends.
+	"""
+	statement = []
+	depth = 0
+	for token in tokens:
+		symbol = token.as_symbol()
+		if depth == 0 and len(statement) > 0 and symbol not in CONTINUATIONS and \
+				statement[-1].as_symbol() in ("newline", "dedent"):
+			yield statement
+			statement = []
+		statement.append(token)
+		if symbol == "indent":
+			depth += 1
+		elif symbol == "dedent":
+			depth -= 1
+	if len(statement) > 0:
+		yield statement
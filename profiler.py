@@ -0,0 +1,191 @@
+"""
+Profiling of translation: wall and CPU time, allocated memory blocks and counters for every phase.
+"""
+import cProfile
+import gc
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# order of phases in reports
+PHASES = ["lexing", "recognition", "tree", "semantics", "shaking", "optimization", "generation"]
+COUNTERS = ["tokens", "states", "nodes", "lines"]
+
+
+class Profile:
+	"""
+	Profile of translation of one file. Phases are measured with `phase` and sizes are stored with `count`.
+	With `calls` every phase is also profiled by `cProfile`, and statistics are saved by `dump_stats`.
+	"""
+
+	def __init__(self, calls=False):
+		self.phases = {}
+		self.counters = {}
+		self.calls = calls
+		self.profilers = {}
+
+	@contextmanager
+	def phase(self, name: str):
+		profiler = None
+		if self.calls:
+			profiler = self.profilers.setdefault(name, cProfile.Profile())
+			profiler.enable()
+		blocks = sys.getallocatedblocks()
+		cpu = time.thread_time()
+		wall = time.perf_counter()
+		try:
+			yield
+		finally:
+			wall = time.perf_counter() - wall
+			cpu = time.thread_time() - cpu
+			# net amount of memory blocks allocated by the phase, e.g. size of the built tree
+			blocks = sys.getallocatedblocks() - blocks
+			if profiler is not None:
+				profiler.disable()
+			record = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "blocks": 0})
+			record["wall"] += wall
+			record["cpu"] += cpu
+			record["blocks"] += blocks
+
+	def count(self, name: str, value: int):
+		self.counters[name] = value
+
+	def total(self) -> float:
+		return sum(record["wall"] for record in self.phases.values())
+
+	def as_dict(self) -> dict:
+		return {"phases": self.phases, "counters": self.counters, "total": self.total()}
+
+	def dump_stats(self, prefix: str) -> list:
+		"""Writes statistics of `cProfile` for every phase into `<prefix>.<phase>.pstats` files."""
+		paths = []
+		for name, profiler in self.profilers.items():
+			path = "{}.{}.pstats".format(prefix, name)
+			profiler.dump_stats(path)
+			paths.append(path)
+		return paths
+
+
+class MemoryProfile(Profile):
+	"""
+	Profile which also traces memory of every phase with `tracemalloc`: peak and retained bytes,
+	top sites (file:line) of retained memory, and amount of live objects of `types` (name -> class).
+	Tracing makes translation several times slower, so it's meant for benchmarks rather than builds.
+	"""
+
+	def __init__(self, types=None, sites=5):
+		super().__init__()
+		self.types = dict(types or {})
+		self.sites = sites
+		self.memory = {}
+		self.initial = {}
+		self.peak = 0
+
+	def start(self):
+		"""Starts tracing, objects alive before it aren't counted."""
+		# trees of previous translations have reference cycles, they're collected so they aren't counted as alive
+		gc.collect()
+		self.initial = self.count_objects()
+		tracemalloc.start()
+		self.peak = 0
+
+	def stop(self):
+		tracemalloc.stop()
+
+	def count_objects(self) -> dict:
+		counts = dict.fromkeys(self.types, 0)
+		# names of counted types by class of the object, subclasses (e.g. of `Token`) are counted as their bases
+		kinds = {}
+		for instance in gc.get_objects():
+			cls = type(instance)
+			names = kinds.get(cls)
+			if names is None:
+				names = kinds[cls] = [name for name, kind in self.types.items() if issubclass(cls, kind)]
+			for name in names:
+				counts[name] += 1
+		return counts
+
+	@contextmanager
+	def phase(self, name: str):
+		if not tracemalloc.is_tracing():
+			with super().phase(name):
+				yield
+			return
+		base = tracemalloc.get_traced_memory()[0]
+		before = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+		if hasattr(tracemalloc, "reset_peak"):
+			tracemalloc.reset_peak()
+		start, previous = tracemalloc.get_traced_memory()
+		try:
+			with super().phase(name):
+				yield
+		finally:
+			current, peak = tracemalloc.get_traced_memory()
+			# peak is reset by every phase, so peak of the whole translation (without the snapshot) is kept separately
+			self.peak = max(self.peak, peak - (start - base))
+			# without `reset_peak` (before Python 3.9) peak is known only if the phase exceeds peaks of earlier ones,
+			# otherwise memory retained by the phase is its lower bound
+			if not hasattr(tracemalloc, "reset_peak") and peak <= previous:
+				peak = max(current, start)
+			# memory of the snapshot taken before the phase is not a part of the phase
+			after = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+			differences = after.compare_to(before, "lineno")
+			sites = [{
+				"site": "{}:{}".format(difference.traceback[0].filename, difference.traceback[0].lineno),
+				"bytes": difference.size_diff,
+				"blocks": difference.count_diff,
+			} for difference in differences[:self.sites] if difference.size_diff > 0]
+			# objects are counted after memory is measured, so the list of all objects isn't traced as a phase's memory
+			counts = self.count_objects()
+			self.memory[name] = {
+				"peak": peak - start,
+				"retained": current - start,
+				"sites": sites,
+				"objects": {kind: counts[kind] - self.initial.get(kind, 0) for kind in counts},
+			}
+
+	def as_dict(self) -> dict:
+		result = super().as_dict()
+		result["memory"] = self.memory
+		return result
+
+
+def phase(profile, name: str):
+	"""Measures the phase if profile is set, does nothing otherwise."""
+	return profile.phase(name) if profile is not None else nullcontext()
+
+
+def aggregate(records: dict) -> dict:
+	"""Sums profiles of files (dictionaries made by `Profile.as_dict`, by name of file)."""
+	total = {"phases": {}, "counters": {}, "total": 0.0}
+	for record in records.values():
+		for name, values in record["phases"].items():
+			phase_total = total["phases"].setdefault(name, {"wall": 0.0, "cpu": 0.0, "blocks": 0})
+			for key, value in values.items():
+				phase_total[key] += value
+		for name, value in record["counters"].items():
+			total["counters"][name] = total["counters"].get(name, 0) + value
+		total["total"] += record["total"]
+	return total
+
+
+def format_report(records: dict) -> str:
+	"""Table with wall time of phases (ms) and counters of every file, and their totals."""
+	total = aggregate(records)
+	phases = [name for name in PHASES if name in total["phases"]]
+	counters = [name for name in COUNTERS if name in total["counters"]]
+	width = max([len(name) for name in records] + [5])
+	header = ["{:<{}}".format("file", width)] + ["{:>12}".format(name) for name in phases + ["total"] + counters]
+	lines = [" ".join(header)]
+	for name, record in sorted(records.items(), key=lambda item: -item[1]["total"]) + [("total", total)]:
+		row = ["{:<{}}".format(name, width)]
+		row += ["{:12.2f}".format(record["phases"].get(phase, {"wall": 0.0})["wall"] * 1000) for phase in phases]
+		row.append("{:12.2f}".format(record["total"] * 1000))
+		row += ["{:12d}".format(record["counters"].get(counter, 0)) for counter in counters]
+		lines.append(" ".join(row))
+	cpu = ", ".join("{} {:.2f}".format(name, total["phases"][name]["cpu"] * 1000) for name in phases)
+	blocks = ", ".join("{} {}".format(name, total["phases"][name]["blocks"]) for name in phases)
+	lines.append("CPU time (ms): " + cpu)
+	lines.append("Allocated memory blocks: " + blocks)
+	return "\n".join(lines)
@@ -0,0 +1,494 @@
+from lexer import Token
+from parse import SyntaxTree
+
+ASSIGNED = "assigned"
+LOOP = "loop"
+FUNCTION = "function"
+PARAMETER = "parameter"
+KEY = "key"
+USED = "used"
+
+# Lua allows at most 200 local variables per function, part of them is left for the generated code
+MAX_LOCALS = 150
+
+
+def walk(tree: SyntaxTree):
+	"""Iterates over all nodes of the subtree in source order, without recursion."""
+	pending = [tree]
+	while pending:
+		node = pending.pop()
+		yield node
+		pending.extend(child for child in reversed(node) if isinstance(child, SyntaxTree))
+
+
+def identifiers(tree: SyntaxTree):
+	for node in walk(tree):
+		if node.label() == "<Identifier>":
+			yield node
+
+
+def role(identifier: SyntaxTree) -> str:
+	"""Tells how <Identifier> node is used by its parent."""
+	parent = identifier.parent()
+	label = parent.label()
+	if label == "<assignment>":
+		# assignments inside of `dict(...)` are keyword arguments, not variables
+		if parent.parent().label() == "<named_expression>":
+			return KEY
+		return ASSIGNED
+	if label == "<for_loop>":
+		return LOOP
+	if label == "<function>":
+		return FUNCTION
+	if label == "<Identifiers>":
+		return PARAMETER
+	return USED
+
+
+def enclosing_function(node: SyntaxTree):
+	"""Returns <function> node which contains the node, or None for top-level code."""
+	# functions are declared only at the top level, so the first <program> or <function> above decides
+	while node.parent() is not None:
+		node = node.parent()
+		if node.label() == "<function>":
+			return node
+		if node.label() == "<program>":
+			return None
+	return None
+
+
+def enclosing_block(node: SyntaxTree) -> SyntaxTree:
+	while node.label() != "<block>":
+		node = node.parent()
+	return node
+
+
+def parameters(function: SyntaxTree) -> list:
+	if isinstance(function[3], SyntaxTree):
+		return [node.first_token.content for node in identifiers(function[3])]
+	return []
+
+
+class LocalScopes:
+	"""
+	Decides which names can be declared as `local` in generated Lua code.
+
+	Names assigned inside of a function (except its parameters) are local to it, as in Python.
+	If the first occurrence of the name is an assignment in the function body itself,
+	it's declared right there (`local a = 1`), otherwise it's declared at the start of the function,
+	since Lua locals are visible only inside of their block.
+	Loop variables are already local in Lua and are left as they are.
+
+	Top-level functions become `local function` when they are declared once, are never reassigned
+	and aren't referenced by any code before their declaration (e.g. by a previously declared function).
+	"""
+
+	def __init__(self, program: SyntaxTree):
+		# tokens of assigned identifiers and function names which are declared as local in place
+		self.local_tokens = set()
+		# names to declare at the start of function, by `def` token of the function
+		self.declared = {}
+		functions = []
+		declarations = {}
+		reassigned = set()
+		first_reference = {}
+		for index, node in enumerate(identifiers(program)):
+			name = node.first_token.content
+			kind = role(node)
+			if kind == FUNCTION:
+				functions.append(node.parent())
+				declarations.setdefault(name, []).append(index)
+				continue
+			if kind == KEY:
+				continue
+			if kind in (ASSIGNED, LOOP) and enclosing_function(node) is None:
+				reassigned.add(name)
+			first_reference.setdefault(name, index)
+
+		local_functions = 0
+		for function in functions:
+			name = function[1].first_token.content
+			self.__collect_function_locals(function)
+			indexes = declarations[name]
+			if (len(indexes) == 1 and name not in reassigned and first_reference.get(name, indexes[0]) >= indexes[0]
+					and local_functions < MAX_LOCALS):
+				self.local_tokens.add(function[1].first_token)
+				local_functions += 1
+
+	def __collect_function_locals(self, function: SyntaxTree):
+		block = function[-1]
+		skipped = set(parameters(function))
+		first = {}
+		assigned = set()
+		for node in identifiers(block):
+			name = node.first_token.content
+			kind = role(node)
+			if kind == KEY:
+				continue
+			first.setdefault(name, node)
+			if kind == ASSIGNED and name not in skipped:
+				assigned.add(name)
+
+		declared = []
+		names = [name for name in first if name in assigned]
+		for name in names[:MAX_LOCALS]:
+			node = first[name]
+			if role(node) == ASSIGNED and enclosing_block(node) is block:
+				self.local_tokens.add(node.first_token)
+			else:
+				declared.append(name)
+		if len(declared) > 0:
+			self.declared[function[0].token] = declared
+
+	def is_local(self, token: Token) -> bool:
+		return token in self.local_tokens
+
+	def declared_in(self, def_token: Token) -> list:
+		return self.declared.get(def_token, [])
+
+
+LIST = "list"
+DICT = "dict"
+STRING = "string"
+
+
+def collection_kind(collection: SyntaxTree):
+	"""Tells whether <collection> is a list (or set) literal, a dict literal, or something unknown."""
+	first = collection[0]
+	if isinstance(first, SyntaxTree):
+		return None
+	content = first.token.content
+	if content == "[":
+		return LIST
+	if content == "{" and isinstance(collection[1], SyntaxTree) and collection[1].label() == "<expressions>":
+		return LIST
+	return DICT
+
+
+def concatenation(tree: SyntaxTree) -> list:
+	"""Operands of <String_expressions> together with `+` between them in source order, without recursion."""
+	items = []
+	pending = [tree]
+	while pending:
+		node = pending.pop()
+		if isinstance(node, SyntaxTree) and node.label() == "<String_expressions>":
+			if len(node) > 1:
+				pending.extend(reversed(node))
+			else:
+				items.append(node[0])
+		else:
+			items.append(node)
+	return items
+
+
+def sum_operands(chain: SyntaxTree):
+	"""
+	Operands of <first_priority> node if it only adds them, including sums in parentheses (`a + (b + c)`),
+	in source order. Returns None if there are other operations.
+	"""
+	operands = []
+	pending = [chain]
+	while pending:
+		node = pending.pop()
+		if len(node) > 1 and node[1].token.content != "+":
+			return None
+		# <second_priority> and <third_priority> of a single operand are only wrappers
+		fourth = node[0]
+		if len(fourth) > 1 or len(fourth[0]) > 1:
+			return None
+		fourth = fourth[0][0]
+		if len(node) > 1:
+			pending.append(node[2])
+		if len(fourth) > 1:
+			pending.append(fourth[1])
+		else:
+			operands.append(fourth[0])
+	return operands
+
+
+def has_string_literal(items: list) -> bool:
+	return any(isinstance(item, SyntaxTree) and item.label() == "<String>" for item in items)
+
+
+def value_kind(expression: SyntaxTree, strings=frozenset()):
+	"""
+	Kind of the value of <any_expressions>: LIST, DICT, STRING or None if it's unknown.
+	Concatenation is a STRING if it has a string literal or a variable from `strings` among its operands.
+	Sums in parentheses are parsed as arithmetic, they're STRING if a variable from `strings` is added.
+	"""
+	internal = expression[0]
+	if internal.label() == "<collection>":
+		return collection_kind(internal)
+	if internal.label() == "<String_expressions>":
+		items = concatenation(internal)
+	elif internal.label() == "<mathematical_expressions>":
+		items = sum_operands(internal[0]) or []
+		if len(items) < 2:
+			return None
+	else:
+		return None
+	if has_string_literal(items) or any(item.first_token.content in strings for item in items
+			if isinstance(item, SyntaxTree) and item.label() == "<Identifier>"):
+		return STRING
+	return None
+
+
+def unused_name(names: set, base: str) -> str:
+	name = base
+	index = 0
+	while name in names:
+		index += 1
+		name = base + str(index)
+	return name
+
+
+class CollectionKinds:
+	"""
+	Tracks which names are known to hold lists, dicts or strings.
+	Name is known to hold a list if every assignment to it is a list literal, and it's never a parameter
+	or a loop variable. Names bound inside of a function are tracked for that function only,
+	other names are global, and for them assignments from the whole program are taken into account.
+	Name holds a string if every assignment to it is a string literal or a concatenation with a string literal
+	or with a name which holds a string in its scope (e.g. `s = s + part` after `s = ""`).
+	"""
+
+	def __init__(self, program: SyntaxTree = None):
+		self.names = set()
+		self.global_kinds = {}
+		# kinds of names bound in functions, by `def` token of the function
+		self.function_kinds = {}
+		if program is not None:
+			self.add(program)
+
+	def add(self, *programs: SyntaxTree):
+		"""
+		Takes assignments of the programs into account. Program translated in parts (statement by statement)
+		is added part by part, and kinds are known from the parts added so far.
+		Strings depend on each other (`s = s + part`), so at first every assigned name is taken for a string,
+		and kinds are found again without the names which turned out not to hold strings, until they don't change.
+		"""
+		bindings = []
+		for node in (node for program in programs for node in identifiers(program)):
+			self.names.add(node.first_token.content)
+			kind = role(node)
+			if kind not in (KEY, USED, FUNCTION):
+				bindings.append((node, kind, enclosing_function(node)))
+		global_kinds, function_kinds = self.global_kinds, self.function_kinds
+		# names which may hold strings before the kinds are found for the first time
+		assumed = {node.first_token.content for node, kind, _ in bindings if kind == ASSIGNED}
+		previous = None
+		while previous != (self.global_kinds, self.function_kinds):
+			previous = (self.global_kinds, self.function_kinds)
+			self.global_kinds = dict(global_kinds)
+			self.function_kinds = {scope: dict(kinds) for scope, kinds in function_kinds.items()}
+			strings = {}
+			for node, kind, function in bindings:
+				name = node.first_token.content
+				value = None
+				if kind == ASSIGNED:
+					scope = function[0].token if function is not None else None
+					if scope not in strings:
+						strings[scope] = self.strings_in(function, *previous) | assumed
+					value = value_kind(node.parent()[2], strings[scope])
+				if function is not None:
+					self.__bind(self.function_kinds.setdefault(function[0].token, {}), name, value)
+				if kind == ASSIGNED or function is None:
+					self.__bind(self.global_kinds, name, value)
+			assumed = set()
+
+	def forward_names(self, program: SyntaxTree) -> tuple:
+		"""
+		Names which the program assigns as global variables, and global names which its functions look up
+		(operands of `+` and iterated collections), but which aren't assigned by the program or the programs added so far.
+		Kinds of such names are known only once they are assigned later.
+		"""
+		assigned = set()
+		bound = {}
+		used = []
+		for node in walk(program):
+			label = node.label()
+			if label == "<Identifier>":
+				kind = role(node)
+				if kind in (ASSIGNED, LOOP, PARAMETER):
+					function = enclosing_function(node)
+					if kind == ASSIGNED or function is None:
+						assigned.add(node.first_token.content)
+					if function is not None:
+						bound.setdefault(function[0].token, set()).add(node.first_token.content)
+			elif label == "<String_expressions>" and node.parent().label() != label:
+				used.extend(concatenation(node))
+			elif label == "<first_priority>" and node.parent().label() != label:
+				used.extend(sum_operands(node) or ())
+			elif label == "<for_loop>" and isinstance(node[3], SyntaxTree):
+				used.append(node[3][0])
+		unknown = set()
+		for node in used:
+			if not isinstance(node, SyntaxTree) or node.label() != "<Identifier>":
+				continue
+			function = enclosing_function(node)
+			name = node.first_token.content
+			if (function is not None and name not in self.global_kinds and name not in assigned and
+					name not in bound.get(function[0].token, ())):
+				unknown.add(name)
+		return assigned, unknown
+
+	@staticmethod
+	def strings_in(function: SyntaxTree, global_kinds: dict, function_kinds: dict) -> set:
+		"""Names which hold strings according to the kinds in the function (or at the top level for None)."""
+		local = function_kinds.get(function[0].token, {}) if function is not None else {}
+		names = {name for name, kind in global_kinds.items() if kind == STRING and name not in local}
+		names.update(name for name, kind in local.items() if kind == STRING)
+		return names
+
+	@staticmethod
+	def __bind(kinds: dict, name: str, value):
+		if name in kinds and kinds[name] != value:
+			value = None
+		kinds[name] = value
+
+	def kind_of(self, collection: SyntaxTree):
+		"""Kind of the value of <collection> node: LIST, DICT, STRING or None if it's unknown."""
+		first = collection[0]
+		if not isinstance(first, SyntaxTree):
+			return collection_kind(collection)
+		if first.label() != "<Identifier>":
+			return None
+		return self.kind_of_name(first.first_token.content, collection)
+
+	def kind_of_name(self, name: str, node: SyntaxTree):
+		"""Kind of the value of the variable used at the node."""
+		function = enclosing_function(node)
+		if function is not None:
+			kinds = self.function_kinds.get(function[0].token, {})
+			if name in kinds:
+				return kinds[name]
+		return self.global_kinds.get(name)
+
+
+def length_argument(length: SyntaxTree):
+	"""Name of the variable measured by <length_expressions> node (`len(a)`), or None for other arguments."""
+	argument = length[2]
+	if argument.label() == "<collection>":
+		argument = argument[0]
+	if isinstance(argument, SyntaxTree) and argument.label() == "<Identifier>":
+		return argument.first_token.content
+	return None
+
+
+class LoopInvariants:
+	"""
+	Finds values used in a loop which can be computed once before it:
+	functions that are called in the loop (including `print`) and lengths of variables.
+
+	Function is hoisted when its name is never assigned and never used as a variable or parameter,
+	so the global can't change while the loop runs.
+	Length `#a` is hoisted when `a` isn't assigned in the loop and can't be reassigned by functions called from it
+	(tables can't be modified in place by translated code, only names can be rebound).
+	Lengths from the body are hoisted only for known collections, since the body may never run,
+	and `#` of anything else can fail; lengths from the condition of `while` are evaluated anyway.
+	"""
+
+	def __init__(self, program: SyntaxTree, collections: CollectionKinds):
+		self.collections = collections
+		self.names = set()
+		self.rebound = set()
+		self.bound_in_functions = set()
+		for node in identifiers(program):
+			name = node.first_token.content
+			self.names.add(name)
+			kind = role(node)
+			if kind in (ASSIGNED, LOOP, PARAMETER):
+				self.rebound.add(name)
+			if kind in (ASSIGNED, LOOP) and enclosing_function(node) is not None:
+				self.bound_in_functions.add(name)
+
+	def functions(self, loop: SyntaxTree) -> list:
+		"""Names of global functions called in <while_loop> or <for_loop> which can be hoisted."""
+		names = []
+		for node in walk(loop):
+			label = node.label()
+			if label == "<function_call>":
+				name = node.first_token.content
+			elif label == "<output>":
+				name = "print"
+			else:
+				continue
+			if name not in self.rebound and name not in names:
+				names.append(name)
+		return names
+
+	def lengths(self, loop: SyntaxTree) -> list:
+		"""Names of variables, which length can be computed before <while_loop> or <for_loop>."""
+		bound = set()
+		calls = False
+		candidates = []
+		for node in walk(loop):
+			label = node.label()
+			if label == "<Identifier>" and role(node) in (ASSIGNED, LOOP):
+				bound.add(node.first_token.content)
+			elif label == "<function_call>":
+				calls = True
+			elif label == "<length_expressions>":
+				candidates.append(node)
+
+		function = enclosing_function(loop)
+		local = set(parameters(function)) if function is not None else set()
+		condition = loop[1] if loop.label() == "<while_loop>" else None
+		names = []
+		for length in candidates:
+			name = length_argument(length)
+			if name is None or name in bound or name in names:
+				continue
+			if calls and name in self.bound_in_functions and name not in local:
+				continue
+			if not self.__is_evaluated(length, condition) and self.collections.kind_of_name(name, length) is None:
+				continue
+			names.append(name)
+		return names
+
+	@staticmethod
+	def __is_evaluated(node: SyntaxTree, condition):
+		while node is not None:
+			if node is condition:
+				return True
+			node = node.parent()
+		return False
+
+
+def accumulators(loop: SyntaxTree, collections: CollectionKinds) -> list:
+	"""
+	Names of strings which are only extended in <while_loop> or <for_loop> (`s = s + part`),
+	so parts can be collected into a table and concatenated once after the loop.
+	Loops with calls of functions (which could read the string) and `return` are skipped.
+	"""
+	if "table" in collections.names:
+		return []
+	uses = {}
+	extended = {}
+	for node in walk(loop):
+		label = node.label()
+		if label == "<function_call>":
+			return []
+		if label == "<special_body>" and node[0].token.content == "return":
+			return []
+		if label == "<Identifier>":
+			name = node.first_token.content
+			uses[name] = uses.get(name, 0) + 1
+		elif label == "<assignment>" and role(node[0]) == ASSIGNED:
+			name = node[0].first_token.content
+			if accumulated(node) == name:
+				extended[name] = extended.get(name, 0) + 1
+	# the name is used only as the target and the first operand of its extensions
+	return [name for name, count in extended.items()
+			if uses[name] == 2 * count and collections.kind_of_name(name, loop) == STRING]
+
+
+def accumulated(assignment: SyntaxTree):
+	"""Name of the variable extended by <assignment> of the form `s = s + part`, or None."""
+	internal = assignment[2][0]
+	if internal.label() != "<String_expressions>" or len(internal) == 1:
+		return None
+	first = concatenation(internal)[0]
+	if first.label() != "<Identifier>" or first.first_token.content != assignment[0].first_token.content:
+		return None
+	return first.first_token.content
@@ -1,15 +1,27 @@
 from nltk.tree import Tree, ParentedTree
 from lexer import Token
 from errors import SemanticError
+from parse import SyntaxTree
+from visitor import Visitor, visits
 
 
-class SemanticAnalyzer(object):
-    def __init__(self, tree: Tree):
-        self.tree = ParentedTree.convert(tree)
+class SemanticAnalyzer(Visitor):
+    """
+    Checks identifiers of the tree. Every <Identifier> node is dispatched by the label of its parent,
+    which tells how the identifier is used (assigned, declared as function, called, etc).
+    Errors are raised if `strict` is set, otherwise they are collected into `errors`
+    and the tree is analyzed to the end (e.g. to find reachable functions of unchecked code).
+    """
+    def __init__(self, tree: Tree = None, strict=True):
+        self.tree = tree if tree is None or isinstance(tree, SyntaxTree) else SyntaxTree.convert(tree)
+        self.strict = strict
+        self.errors = []
         self.known_identifiers = {'<program>': set()}
         self.known_function_parameters = {}
         self.identifiers_to_catch_in_function = {}
         self.function_identifiers_to_catch_in_function = {}
+        # identifiers used as values or called by the code outside of functions
+        self.program_identifiers = set()
 
     def get_identifiers_with_their_scope(self):
         return self.known_identifiers
@@ -20,29 +32,67 @@ class SemanticAnalyzer(object):
     def get_identifiers_to_catch_in_function(self):
         return self.identifiers_to_catch_in_function
 
+    def get_reachable_functions(self, exports=()) -> set:
+        """
+        Names of functions which can run: called or used as values by the top-level code or listed in `exports`,
+        and functions used by them. Has to be called after `check_tree`.
+        """
+        functions = self.known_function_parameters.keys()
+        pending = [name for name in self.program_identifiers.union(exports) if name in functions]
+        reachable = set(pending)
+        while pending:
+            name = pending.pop()
+            used = (self.function_identifiers_to_catch_in_function.get(name, set()) |
+                    self.identifiers_to_catch_in_function.get(name, set()))
+            for used_name in used:
+                if used_name in functions and used_name not in reachable:
+                    reachable.add(used_name)
+                    pending.append(used_name)
+        return reachable
+
     def check_tree(self):
         if not self.tree:
             raise SemanticError("Semantic Error\nTree wasn\'t set")
         self.__check_identifiers()
 
+    def check_part(self, tree: SyntaxTree):
+        """
+        Checks the next part of the program (tree of its following top-level statements),
+        with identifiers and functions declared by the parts checked before.
+        """
+        self.tree = tree
+        self.check_tree()
+
+    def __report(self, message: str, token: Token) -> None:
+        token = token.copy()
+        token.line += 1
+        token.pos += 1
+        error = SemanticError("Semantic Error\n{}:\n{}".format(message, str(token)))
+        if self.strict:
+            raise error
+        self.errors.append(error)
+
     def __get_current_context(self, node: ParentedTree) -> str:
-        while node.parent() and node.parent().label() != '<function>':
-            node = node.parent()
-        if node.parent() and node.parent().label() == '<function>':
-            current_context = str(list(node.parent().subtrees())[0].leaves()[1])
-            return current_context
+        # functions are declared only at the top level, so there is no need to look above the first <program>
+        parent = node.parent()
+        while parent and parent.label() != '<function>':
+            if parent.label() == '<program>':
+                return '<program>'
+            parent = parent.parent()
+        if parent:
+            return parent[1].first_token.content
         return '<program>'
 
     def __store_function_parameters(self, func: ParentedTree) -> None:
-        if self.__get_current_context(func) in self.known_function_parameters:
-            self.known_function_parameters[self.__get_current_context(func)] = 0
-        self.known_function_parameters.setdefault(self.__get_current_context(func), 0)
-        for node in func.parent().subtrees():
-            if node.parent().label() == '<Identifiers>' and node.label() == '<Identifier>':
-                self.known_function_parameters[self.__get_current_context(node)] += 1
+        parameters = func.parent()[3]
+        count = 0
+        if isinstance(parameters, SyntaxTree) and parameters.label() == '<Identifiers>':
+            # identifiers are separated with commas
+            count = (parameters.leaf_count + 1) // 2
+        self.known_function_parameters[self.__get_current_context(func)] = count
 
     def __check_function_parameters(self, func: ParentedTree) -> None:
-        current_context = str(func.leaves()[0])
+        current_context = func.first_token.content
         known_function_parameters = 0
         for node in func.subtrees():
             if node.label() == '<expressions>':
@@ -50,12 +100,7 @@ class SemanticAnalyzer(object):
         current_known_parameters = self.known_function_parameters.get(current_context)
         if (current_known_parameters is None or
                 current_known_parameters != known_function_parameters):
-            token = func.leaves()[0].token.copy()
-            token.line += 1
-            token.pos += 1
-            raise SemanticError("Semantic Error\nParameters in the declaration and function call do not match:\n{}".format(
-                                    str(token)
-                                ))
+            self.__report("Parameters in the declaration and function call do not match", func.first_token)
 
     def __check_function_call_catch_identifiers(self, identifier_token: Token, func_name: str) -> None:
         current_variable_identifiers_to_catch = self.identifiers_to_catch_in_function.get(func_name)
@@ -66,12 +111,7 @@ class SemanticAnalyzer(object):
         current_variable_identifiers_to_catch -= self.known_identifiers.get(func_name)
         current_variable_identifiers_to_catch -= self.known_identifiers.get('<program>')
         if current_variable_identifiers_to_catch:
-            token = identifier_token.copy()
-            token.line += 1
-            token.pos += 1
-            raise SemanticError("Semantic Error\nWhen the function was called, the variable used in it was not declared:\n{}".format(
-                                    str(token)
-                                ))
+            self.__report("When the function was called, the variable used in it was not declared", identifier_token)
 
     def __check_function_call_catch_func_identifiers(self, identifier_token: Token, func_name: str) -> None:
         current_function_identifiers_to_catch = self.function_identifiers_to_catch_in_function.get(func_name)
@@ -82,66 +122,62 @@ class SemanticAnalyzer(object):
         for current_function_to_catch_name in current_function_identifiers_to_catch:
             if (current_function_to_catch_name not in self.known_identifiers and
                     current_function_to_catch_name not in self.known_identifiers[func_name]):
-                token = identifier_token.copy()
-                token.line += 1
-                token.pos += 1
-                raise SemanticError(
-                    "Semantic Error\nWhen the function was called, the function name used in it was not declared:\n{}".format(str(token)))
+                self.__report("When the function was called, the function name used in it was not declared",
+                              identifier_token)
+                return
 
     def __check_identifiers(self) -> None:
         for node in self.tree.subtrees():
-            if not node.parent():
-                continue
-            elif node.label() == '<Identifier>':
-                current_node_parent_label = node.parent().label()
-                if current_node_parent_label == '<assignment>' or current_node_parent_label == '<for_loop>':
-                    self.known_identifiers.setdefault(self.__get_current_context(node), set()).add(
-                        str(node.leaves()[0]))
-                elif current_node_parent_label == '<function>':
-                    if str(node.leaves()[0]) in self.known_identifiers:
-                        self.identifiers_to_catch_in_function[str(node.leaves()[0])] = {str(node.leaves()[0])}
-                    self.known_identifiers[str(node.leaves()[0])] = {str(node.leaves()[0])}
-                    self.known_identifiers['<program>'].add(str(node.leaves()[0]))
-                    self.__store_function_parameters(node)
-                elif current_node_parent_label == '<Identifiers>':
-                    self.known_identifiers[self.__get_current_context(node)].add(str(node.leaves()[0]))
-                elif current_node_parent_label == '<function_call>':
-                    if self.__get_current_context(node) != '<program>':
-                        self.function_identifiers_to_catch_in_function.setdefault(self.__get_current_context(node),
-                                                                                  set())
-                        self.function_identifiers_to_catch_in_function[
-                            self.__get_current_context(node)
-                        ].add(str(node.leaves()[0]))
-                        continue
-                    if str(node.leaves()[0]) not in self.known_identifiers:
-                        if str(node.leaves()[0]) in self.known_identifiers.get(self.__get_current_context(node)):
-                            continue
-                        token = node.leaves()[0].token.copy()
-                        token.line += 1
-                        token.pos += 1
-                        raise SemanticError(
-                            "Semantic Error\nThe function identifier was used before it was announced:\n{}".format(
-                                str(token)
-                            ))
-                    if self.__get_current_context(node) == '<program>':
-                        self.__check_function_call_catch_identifiers(node.leaves()[0].token, str(node.leaves()[0]))
-                        self.__check_function_call_catch_func_identifiers(node.leaves()[0].token, str(node.leaves()[0]))
-                    self.__check_function_parameters(node.parent())
-                else:
-                    current_context = self.__get_current_context(node)
-                    if current_context != '<program>':
-                        self.identifiers_to_catch_in_function.setdefault(current_context, set())
-                        self.identifiers_to_catch_in_function[current_context].add(str(node.leaves()[0]))
-                        continue
-                    current_context = self.known_identifiers.get(self.__get_current_context(node))
-                    if ((not current_context or
-                         str(node.leaves()[0]) not in current_context) and
-                            str(node.leaves()[0]) not in self.known_identifiers['<program>']):
-                        token = node.leaves()[0].token.copy()
-                        token.line += 1
-                        token.pos += 1
-                        raise SemanticError(
-                            "Semantic Error\nThe identifier was encountered before it was announced:\n{}".format(
-                                str(token)
-                            )
-                        )
+            if node.label() == '<Identifier>' and node.parent():
+                self.visit(node, node.parent().label())
+
+    @visits('<assignment>', '<for_loop>')
+    def __check_assigned_identifier(self, node: ParentedTree) -> None:
+        self.known_identifiers.setdefault(self.__get_current_context(node), set()).add(
+            node.first_token.content)
+
+    @visits('<function>')
+    def __check_function_identifier(self, node: ParentedTree) -> None:
+        if node.first_token.content in self.known_identifiers:
+            self.identifiers_to_catch_in_function[node.first_token.content] = {node.first_token.content}
+        self.known_identifiers[node.first_token.content] = {node.first_token.content}
+        self.known_identifiers['<program>'].add(node.first_token.content)
+        self.__store_function_parameters(node)
+
+    @visits('<Identifiers>')
+    def __check_parameter_identifier(self, node: ParentedTree) -> None:
+        self.known_identifiers[self.__get_current_context(node)].add(node.first_token.content)
+
+    @visits('<function_call>')
+    def __check_called_identifier(self, node: ParentedTree) -> None:
+        if self.__get_current_context(node) != '<program>':
+            self.function_identifiers_to_catch_in_function.setdefault(self.__get_current_context(node),
+                                                                      set())
+            self.function_identifiers_to_catch_in_function[
+                self.__get_current_context(node)
+            ].add(node.first_token.content)
+            return
+        self.program_identifiers.add(node.first_token.content)
+        if node.first_token.content not in self.known_identifiers:
+            if node.first_token.content in self.known_identifiers.get(self.__get_current_context(node)):
+                return
+            self.__report("The function identifier was used before it was announced", node.first_token)
+            return
+        if self.__get_current_context(node) == '<program>':
+            self.__check_function_call_catch_identifiers(node.first_token, node.first_token.content)
+            self.__check_function_call_catch_func_identifiers(node.first_token, node.first_token.content)
+        self.__check_function_parameters(node.parent())
+
+    def visit_default(self, node: ParentedTree) -> None:
+        """Identifier used as a value inside of expression."""
+        current_context = self.__get_current_context(node)
+        if current_context != '<program>':
+            self.identifiers_to_catch_in_function.setdefault(current_context, set())
+            self.identifiers_to_catch_in_function[current_context].add(node.first_token.content)
+            return
+        self.program_identifiers.add(node.first_token.content)
+        current_context = self.known_identifiers.get(self.__get_current_context(node))
+        if ((not current_context or
+             node.first_token.content not in current_context) and
+                node.first_token.content not in self.known_identifiers['<program>']):
+            self.__report("The identifier was encountered before it was announced", node.first_token)
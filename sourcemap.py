@@ -0,0 +1,158 @@
+"""
+Source maps from translated Lua code back to Python (https://sourcemaps.info/spec.html, version 3),
+and a tool which rewrites `file.lua:line` references in Lua stack traces or profiler output
+into `file.py:line` references.
+
+Usage: python sourcemap.py <map file or directory with maps>... < trace.txt
+"""
+import json
+import os
+import re
+import sys
+
+BASE64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+BASE64_VALUES = {character: value for value, character in enumerate(BASE64)}
+LUA_REFERENCE = re.compile(r"(?P<file>[^\s:'\"()\[\]]+\.lua):(?P<line>\d+)")
+
+
+def encode_vlq(value: int) -> str:
+	"""Encodes integer as base64 VLQ: sign in the lowest bit, groups of 5 bits with continuation bit."""
+	value = (-value << 1) | 1 if value < 0 else value << 1
+	encoded = ""
+	while True:
+		digit = value & 31
+		value >>= 5
+		if value > 0:
+			digit |= 32
+		encoded += BASE64[digit]
+		if value == 0:
+			return encoded
+
+
+def decode_vlq(text: str) -> list:
+	values = []
+	value = 0
+	shift = 0
+	for character in text:
+		digit = BASE64_VALUES[character]
+		value |= (digit & 31) << shift
+		shift += 5
+		if digit & 32 == 0:
+			values.append(-(value >> 1) if value & 1 else value >> 1)
+			value = 0
+			shift = 0
+	return values
+
+
+def encode_mappings(lines: list) -> str:
+	"""
+	Encodes segments of generated lines, where every segment is a tuple of
+	(generated column, source line, source column), all counted from zero.
+	"""
+	encoded = []
+	source_line = 0
+	source_column = 0
+	for segments in lines:
+		column = 0
+		parts = []
+		for generated_column, line, line_column in segments:
+			# every field is stored as difference with the previous segment, source index is always 0
+			parts.append(encode_vlq(generated_column - column) + "A" + encode_vlq(line - source_line) +
+				encode_vlq(line_column - source_column))
+			column, source_line, source_column = generated_column, line, line_column
+		encoded.append(",".join(parts))
+	return ";".join(encoded)
+
+
+def decode_mappings(mappings: str) -> list:
+	lines = []
+	source_line = 0
+	source_column = 0
+	for encoded in mappings.split(";"):
+		column = 0
+		segments = []
+		for part in encoded.split(","):
+			if len(part) == 0:
+				continue
+			values = decode_vlq(part)
+			if len(values) < 4:
+				continue
+			column += values[0]
+			source_line += values[2]
+			source_column += values[3]
+			segments.append((column, source_line, source_column))
+		lines.append(segments)
+	return lines
+
+
+def build(lines: list, file: str, source: str) -> dict:
+	return {
+		"version": 3,
+		"file": file,
+		"sources": [source],
+		"names": [],
+		"mappings": encode_mappings(lines),
+	}
+
+
+class SourceMap:
+	"""Decoded source map of one Lua file."""
+
+	def __init__(self, data: dict, directory: str = ""):
+		self.file = data["file"]
+		self.source = os.path.normpath(os.path.join(directory, data["sources"][0]))
+		self.lines = decode_mappings(data["mappings"])
+
+	@staticmethod
+	def load(path: str):
+		with open(path, "r") as file:
+			return SourceMap(json.load(file), os.path.dirname(path))
+
+	def original_line(self, line: int):
+		"""Line of the source (from 1) for the line of Lua code (from 1), or None if it's unknown."""
+		index = min(line - 1, len(self.lines) - 1)
+		# lines without segments (e.g. `end` of a block) belong to the code above them
+		while index >= 0:
+			if len(self.lines[index]) > 0:
+				return self.lines[index][0][1] + 1
+			index -= 1
+		return None
+
+
+def load_maps(paths: list) -> dict:
+	"""Loads maps from files and directories (recursively), by the name of Lua file."""
+	maps = {}
+	for path in paths:
+		if os.path.isdir(path):
+			files = [os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names]
+		else:
+			files = [path]
+		for file in files:
+			if file.endswith(".map"):
+				source_map = SourceMap.load(file)
+				maps[os.path.basename(source_map.file)] = source_map
+	return maps
+
+
+def remap(text: str, maps: dict) -> str:
+	"""Replaces references to lines of translated files (`out/test.lua:12`) with lines of their sources."""
+	def replace(match):
+		source_map = maps.get(os.path.basename(match.group("file")))
+		line = source_map.original_line(int(match.group("line"))) if source_map is not None else None
+		if line is None:
+			return match.group(0)
+		return "{}:{}".format(source_map.source, line)
+	return LUA_REFERENCE.sub(replace, text)
+
+
+def main():
+	if len(sys.argv) < 2:
+		print(__doc__.strip())
+		return
+	maps = load_maps(sys.argv[1:])
+	for line in sys.stdin:
+		sys.stdout.write(remap(line, maps))
+
+
+if __name__ == '__main__':
+	main()
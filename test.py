@@ -1,9 +1,34 @@
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 from errors import SyntacticError
-from lupy import analyzer, EarleyParser
+from generator import Generator
+from lupy import analyzer, atomic_open, EarleyParser, MANIFEST, PROFILE, process, translate, translate_async, translate_many, translate_stream, Translator, \
+	watch
+from parse import TreeToken, SyntaxTree, split_statements
+from visitor import visits
 from lexer import Type, TokenIdentifier, TokenKeyword, TokenOperator, TokenNumber, TokenDivider, TokenString, \
 	TokenIndent, LexicalError
 from semantics import SemanticError, SemanticAnalyzer
+from benchmarks.memory import measure, over_budget
+from cache import TranslationCache
+from benchmarks.scaling import fit_exponent, regressions
+from benchmarks.synthetic import ProgramGenerator
+import client
+import daemon
+import json
+import parse
+import sourcemap
+from profiler import Profile
 import unittest
+from unittest import mock
 
 
 class TestLexical(unittest.TestCase):
@@ -92,6 +117,19 @@ print(a)
 		parser = EarleyParser(tokens)
 		self.assertRaises(SyntacticError, parser.parse)
 
+	def test_error_recovery(self):
+		code_text = "x = (1 + 2\ny = 3\nif y > 1:\n\tprint(y\n\tz = ]\nelse:\n\tpass\ndef f(a:\n\treturn a\nw = = 1\nprint(w)\n"
+		parser = EarleyParser(analyzer.parse(code_text))
+		with self.assertRaises(SyntacticError) as context:
+			parser.parse()
+		diagnostics = context.exception.diagnostics
+		# the rest of the statement (and its block) is skipped, so every error is reported once
+		self.assertEqual([(d.line, d.pos, d.found) for d in diagnostics],
+						 [(1, 11, "newline"), (4, 12, "newline"), (5, 9, "]"), (8, 8, ":"), (10, 5, "=")])
+		self.assertEqual(diagnostics[0].expected, ["%", ")", "*", "**", "+", "-", "/"])
+		self.assertIn("<Identifier>", diagnostics[2].expected)
+		self.assertIn("Line 8 position 8: unexpected ':', expected: ), ,", str(context.exception))
+
 	def test_correct_chain(self):
 		code_text = r"""
 a = 1
@@ -134,6 +172,30 @@ baz(a, a, a)
 		tree = parser.parse()
 		self.assertIsNotNone(tree, "This code chain is not correct")
 
+	def test_token_spans(self):
+		code_text = r"""
+def foo(a, b):
+	for i in [a, b, (a + b) * 2]:
+		print(i)
+
+c = {1: foo(1, 2), 2: len([])}
+"""
+		tree = EarleyParser(analyzer.parse(code_text)).parse()
+		for node in tree.subtrees():
+			leaves = node.leaves()
+			self.assertEqual(node.leaf_count, len(leaves))
+			self.assertIs(node.first_token, leaves[0].token)
+			self.assertIs(node.last_token, leaves[-1].token)
+
+	def test_split_statements(self):
+		code_text = "a = 1\n\nif a:\n\tprint(a)\nelif a:\n\tif a:\n\t\tpass\nelse:\n\tpass\ndef newline(x):\n\treturn x\nnewline(a)\n"
+		statements = list(split_statements(analyzer.scan(code_text)))
+		self.assertEqual([token.content for token in sum(statements, [])],
+						 [token.content for token in analyzer.parse(code_text)])
+		self.assertEqual([statement[0].content for statement in statements], ["a", "if", "def", "newline"])
+		for statement in statements:
+			self.assertIsNotNone(EarleyParser(statement).parse())
+
 
 class TestSemantic(unittest.TestCase):
 	def test_correct_program(self):
@@ -357,6 +419,751 @@ foo(1, bar)
 		semantic_analyzer = SemanticAnalyzer(parser.parse())
 		semantic_analyzer.check_tree()
 
+	def test_reachable_functions(self):
+		code_text = r"""
+def foo():
+	bar()
+def bar():
+	pass
+def baz(a):
+	return a
+def unused():
+	baz(1)
+def callback():
+	pass
+def entry():
+	pass
+a = foo
+a()
+baz(callback)
+"""
+		semantic_analyzer = SemanticAnalyzer(EarleyParser(analyzer.parse(code_text)).parse())
+		semantic_analyzer.check_tree()
+		self.assertEqual(semantic_analyzer.get_reachable_functions(), {"foo", "bar", "baz", "callback"})
+		self.assertEqual(semantic_analyzer.get_reachable_functions(["entry"]),
+						 {"foo", "bar", "baz", "callback", "entry"})
+
+
+class TestGenerator(unittest.TestCase):
+	root = os.path.dirname(os.path.abspath(__file__))
+	
+	def read(self, *path):
+		with open(os.path.join(self.root, *path), "r") as file:
+			return file.read()
+	
+	def test_sample_translation(self):
+		code_text = self.read("input", "test.py")
+		self.assertEqual(translate(code_text), self.read("output", "test.lua"))
+	
+	def test_stream_into_file_object(self):
+		code_text = self.read("input", "test.py")
+		out = io.StringIO()
+		self.assertIsNone(translate(code_text, out=out))
+		self.assertEqual(out.getvalue(), translate(code_text))
+	
+	def test_local_variables(self):
+		code_text = r"""
+def foo(a, c):
+	if c:
+		x = 1
+	else:
+		x = a
+	y = x
+	for i in range(2):
+		print(i)
+	return y
+
+def bar(n):
+	return baz(n)
+
+def baz(n):
+	return n
+
+z = bar(1)
+"""
+		lines = [line.strip() for line in translate(code_text, local_variables=True).split("\n")]
+		self.assertEqual(lines[1], "local function foo(a, c) local x")
+		self.assertIn("local y = x", lines)
+		self.assertIn("for i = 0, 1 do", lines)
+		self.assertIn("local function bar(n)", lines)
+		# `baz` is used by `bar` before it's declared, so it has to stay global
+		self.assertIn("function baz(n)", lines)
+		self.assertIn("z = bar(1)", lines)
+		self.assertNotIn("local", translate(code_text))
+	
+	def test_lua_arrays(self):
+		code_text = r"""
+a = [1, 2, 3]
+b = {1: 2, 3: 4}
+c = {5, 6}
+d = len(a) + len([])
+"""
+		self.assertEqual(translate(code_text, lua_arrays=True), """
+a = {1, 2, 3}
+b = {[1] = 2, [3] = 4}
+c = {5, 6}
+d = #(a) + #({})""")
+		self.assertIn("a = {[0] = 1, [1] = 2, [2] = 3}", translate(code_text))
+	
+	def test_list_loops(self):
+		code_text = r"""
+items = [1, 2]
+table = {1: 2}
+def foo(items):
+	for i in items:
+		print(i)
+for a in items:
+	print(a)
+for b in table:
+	print(b)
+for c in [3]:
+	print(c)
+"""
+		lines = [line.strip() for line in translate(code_text, lua_arrays=True).split("\n")]
+		# parameter shadows global list, so nothing is known about it
+		self.assertIn("for i in pairs(items) do", lines)
+		self.assertIn("for _, a in ipairs(items) do", lines)
+		self.assertIn("for b in pairs(table) do", lines)
+		self.assertIn("for _, c in ipairs({3}) do", lines)
+		# lists start from 0 by default, so variables are iterated by index and literals are written as sequences
+		lines = [line.strip() for line in translate(code_text).split("\n")]
+		self.assertIn("for i in pairs(items) do", lines)
+		self.assertIn("for i1 = 0, items[0] == nil and -1 or #items do local a = items[i1]", lines)
+		self.assertIn("for b in pairs(table) do", lines)
+		self.assertIn("for _, c in ipairs({3}) do", lines)
+	
+	def test_constant_folding(self):
+		code_text = r"""
+a = 10 * 4 + 2
+for i in range(10 * 4):
+	print(i)
+b = a * (2 + 3) - (1 - 5) ** a
+c = "a" + "b" == "ab" and not False
+d = 7 / 2 + 2 ** 3
+"""
+		self.assertEqual(translate(code_text, optimize=True), """
+a = 42
+for i = 0, 39 do
+    print(i)
+end
+b = a * 5 - (-4) ^ a
+c = true
+d = 11.5""")
+	
+	def test_runtime_dependent_expressions(self):
+		code_text = r"""
+a = 1 / 0
+b = 9223372036854775807 + 1
+c = "a\n" == "a"
+n = 1
+d = not 533 - 638 == n - n
+e = not 2 * 3 + 1 == n
+"""
+		# `not` binds to the first operand in Lua, so arithmetic after it isn't folded
+		self.assertEqual(translate(code_text, optimize=True), translate(code_text))
+	
+	def test_tree_shaking(self):
+		code_text = "def unused():\n\treturn 1\ndef used(a):\n\treturn a\nx = used(2)\n"
+		code = translate(code_text, shake=True)
+		self.assertNotIn("unused", code)
+		self.assertEqual(code.split("\n")[code.split("\n").index("x = used(2)") - 3:], [
+			"function used(a) ", "    return a", "end", "x = used(2)"])
+		self.assertIn("function unused()", translate(code_text, shake=True, exports=["unused"]))
+		self.assertIn("function unused()", translate(code_text))
+		# unsafe code is shaken without semantic errors
+		code_text = "def unused():\n\treturn 1\ndef used(a):\n\treturn a\nx = used(2, 3)\nprint(y)\n"
+		self.assertRaises(SemanticError, translate, code_text, shake=True)
+		code = translate(code_text, safe=False, shake=True)
+		self.assertNotIn("unused", code)
+		self.assertIn("function used(a) ", code)
+	
+	def test_dead_branch_elimination(self):
+		code_text = r"""
+def foo(x):
+	if False:
+		return 1
+	elif x:
+		return 2
+	elif 1 > 2:
+		return 3
+	elif True:
+		return 4
+	else:
+		return 5
+	while False:
+		x = 1
+	if 1 < 2:
+		return x
+"""
+		lines = translate(code_text, optimize=True).split("\n")
+		self.assertEqual(lines[4].strip(), "if x then")
+		self.assertEqual(lines[8].strip(), "else")
+		# statements keep their lines, so line numbers still match the source
+		self.assertEqual(lines[16], "    return x")
+		self.assertNotIn("while", lines)
+		self.assertNotIn("return 1", translate(code_text, optimize=True))
+	
+	def test_hoist_invariants(self):
+		code_text = r"""
+items = [1, 2]
+def total(items):
+	i = 0
+	while i < len(items):
+		i = i + 1
+	return i
+def show(n):
+	return n
+show = total
+i = 0
+while i < len(items):
+	print(show(total(items)))
+	i = i + 1
+for k in range(2):
+	print(len(items))
+	items = [k]
+"""
+		lines = [line.strip() for line in translate(code_text, safe=False, hoist_invariants=True).split("\n")]
+		self.assertIn("do local len_items = #items; while i < len_items do", lines)
+		# `show` is reassigned, so it's looked up on every call
+		self.assertIn("do local print, total, len_items = print, total, #items; while i < len_items do", lines)
+		# `items` is reassigned in the loop
+		self.assertIn("print(#(items))", lines)
+		self.assertIn("do local print = print; for k = 0, 1 do", lines)
+		self.assertEqual(lines.count("end end"), 3)
+		self.assertNotIn("do local", translate(code_text, safe=False))
+	
+	def test_string_concatenation(self):
+		code_text = r"""
+a = 1
+b = a + a
+s = "a" + "b"
+t = s + s
+print(a + b)
+print(t + b)
+"""
+		self.assertEqual(translate(code_text), """
+a = 1
+b = a + a
+s = "a" .. "b"
+t = s .. s
+print(a + b)
+print(t .. b)""")
+	
+	def test_parenthesized_concatenation(self):
+		code_text = r"""
+s = "a"
+n = 1
+u = (s + s) + s
+v = (n + n) * 2
+print(u + (s + u))
+"""
+		self.assertEqual(translate(code_text), """
+s = "a"
+n = 1
+u = (s .. s) .. s
+v = (n + n) * 2
+print(u .. (s .. u))""")
+	
+	def test_concatenation_scopes(self):
+		code_text = r"""
+s = "a"
+def f(a):
+	s = 1
+	t = s + a
+	return t + a
+print(f(2))
+"""
+		# local `s` of the function isn't the global string
+		self.assertIn("    return t + a", translate(code_text, local_variables=True))
+	
+	def test_concatenation_of_mixed_kinds(self):
+		# `s` holds a string and a number, so neither `s` nor `t` is known to be a string
+		code_text = "s = \"a\"\ns = 5\nt = s + 1\nprint(t + 2)\n"
+		self.assertEqual(translate(code_text), "s = \"a\"\ns = 5\nt = s + 1\nprint(t + 2)")
+		code_text = "s = \"\"\nfor k in range(3):\n\ts = s + \"x\"\nt = s + s\nprint(t + t)\n"
+		self.assertIn("print(t .. t)", translate(code_text))
+
+	def test_string_buffers(self):
+		code_text = r"""
+s = ""
+i = 0
+while i < 3:
+	s = s + "x"
+	i = i + 1
+t = "<"
+for k in range(3):
+	t = t + "ab" + "c"
+	print(t)
+u = ""
+for k in range(3):
+	u = u + "ab"
+	u = u + "c"
+print(s + t + u)
+"""
+		lines = [line.strip() for line in translate(code_text, string_buffers=True).split("\n")]
+		self.assertIn("do local s_parts = {s}; while i < 3 do", lines)
+		self.assertIn("s_parts[#s_parts + 1] = \"x\"", lines)
+		self.assertIn("end s = table.concat(s_parts) end", lines)
+		# `t` is read in the loop, so it has to be built on every iteration
+		self.assertIn("t = t .. \"ab\" .. \"c\"", lines)
+		self.assertIn("u_parts[#u_parts + 1] = \"ab\"", lines)
+		self.assertIn("u_parts[#u_parts + 1] = \"c\"", lines)
+		self.assertNotIn("table.concat", translate(code_text))
+	
+	def test_compact_output(self):
+		code_text = r"""
+
+def foo(a):
+	if a % 2 == 0:
+		return a - 1
+	print("a b" + "c")
+x = [1, 2]
+"""
+		generator = Generator(compact=True)
+		code = generator.generate(EarleyParser(analyzer.parse(code_text)).parse())
+		self.assertEqual(code, """function foo(a)
+if a%2==0 then
+return a-1
+end
+print("a b".."c")
+end
+x={[0]=1,[1]=2}""")
+		self.assertEqual(generator.line_map, [2, 3, 4, 4, 5, 5, 6])
+		generator = Generator()
+		code = generator.generate(EarleyParser(analyzer.parse(code_text)).parse())
+		self.assertEqual(len(generator.line_map), len(code.split("\n")))
+		self.assertEqual(generator.line_map[code.split("\n").index("x = {[0] = 1, [1] = 2}")], 6)
+	
+	def test_source_map(self):
+		for value in [0, 1, -1, 15, 16, -16, 1000, -123456]:
+			self.assertEqual(sourcemap.decode_vlq(sourcemap.encode_vlq(value)), [value])
+		code_text = "def foo(a):\n\tif a:\n\t\treturn a\n\treturn 0\nx = foo(1)\n"
+		for compact in [False, True]:
+			generator = Generator(compact=compact, source_map=True)
+			code = generator.generate(EarleyParser(analyzer.parse(code_text)).parse())
+			data = generator.build_source_map("test.lua", "test.py")
+			lines = sourcemap.decode_mappings(data["mappings"])
+			self.assertEqual(len(lines), len(code.split("\n")))
+			last = code.split("\n").index("x = foo(1)" if not compact else "x=foo(1)") + 1
+			columns = [0, 1, 2] if compact else [0, 2, 4]
+			self.assertEqual(lines[last - 1][:3], [(column, 4, pos) for column, pos in zip(columns, [0, 2, 4])])
+			self.assertEqual(lines[code.split("\n").index("end")], [])
+			maps = {"test.lua": sourcemap.SourceMap(data, "src")}
+			trace = "lua: out/test.lua:{}: error\n\t[C]: in ?".format(last)
+			self.assertEqual(sourcemap.remap(trace, maps), "lua: {}:5: error\n\t[C]: in ?".format(os.path.join("src", "test.py")))
+	
+	def test_handler_override(self):
+		class UpperGenerator(Generator):
+			@visits("<boolean>")
+			def generate_boolean(self, tree):
+				token = tree[0].token
+				self.go_to(token)
+				self.add(token.content.upper())
+		
+		# overriding the method by name keeps it a handler, like any other method override
+		class LowerGenerator(UpperGenerator):
+			def generate_boolean(self, tree):
+				token = tree[0].token
+				self.go_to(token)
+				self.add(token.content.lower() + "_")
+		
+		tree = EarleyParser(analyzer.parse("a = True\n")).parse()
+		self.assertEqual(Generator().generate(tree), "a = true")
+		self.assertEqual(UpperGenerator().generate(tree), "a = TRUE")
+		self.assertEqual(LowerGenerator().generate(tree), "a = true_")
+	
+	@staticmethod
+	def long_program(statement, count):
+		"""Builds the tree of `count` copies of one-line statement, bypassing the parser."""
+		sentence = EarleyParser(analyzer.parse(statement)).parse()[0][0]
+		
+		def moved(tree, line):
+			if isinstance(tree, TreeToken):
+				token = tree.token
+				return TreeToken(type(token)(line, token.pos, token.content))
+			return SyntaxTree(tree.label(), [moved(child, line) for child in tree])
+		
+		program = SyntaxTree("<program>", [moved(sentence, count - 1)])
+		for line in reversed(range(count - 1)):
+			program = SyntaxTree("<program>", [moved(sentence, line), program])
+		return SyntaxTree("S", [program])
+	
+	def test_stream(self):
+		code = "s = \"a\"\nprint(s + s)\ndef f(x):\n\treturn x * (2 + 3)\n\nif f(1) > 2:\n\tprint(f(2))\nelse:\n\tpass\n"
+		for options in [{}, {"optimize": True}, {"compact": True}]:
+			parts = list(translate_stream(code, **options))
+			self.assertEqual(len(parts), 4)
+			self.assertEqual("".join(parts), translate(code, **options))
+		
+		generator = Generator(source_map=True)
+		parts = Translator().stream("x = 1\nprint(x)\n", generator=generator)
+		self.assertEqual(next(parts), "x = 1")
+		self.assertEqual(list(parts), ["\nprint(x)"])
+		self.assertEqual(generator.line_map, [0, 1])
+		
+		# function is held back until the global string it concatenates is assigned
+		code = "def f(a):\n\treturn s + a\nn = 1\ns = \"x\"\nprint(f(\"y\"))\n"
+		parts = list(translate_stream(code))
+		self.assertEqual(parts, ["function f(a) \n    return s .. a\nend\nn = 1\ns = \"x\"", "\nprint(f(\"y\"))"])
+		self.assertEqual("".join(parts), translate(code))
+		
+		# statements before the error are translated
+		parts = translate_stream("x = 1\nprint(y)\n")
+		self.assertEqual(next(parts), "x = 1")
+		self.assertRaises(SemanticError, next, parts)
+		with self.assertRaises(ValueError):
+			list(translate_stream("x = 1\n", local_variables=True))
+		with self.assertRaises(ValueError):
+			list(Translator(shake=True).stream("x = 1\n"))
+	
+	def test_long_program_scaling(self):
+		statement = "f()\n"
+		line = translate(statement, safe=False)
+		for count in (10, 1000, 100000):
+			tree = self.long_program(statement, count)
+			self.assertEqual(Generator().generate(tree), "\n".join([line] * count))
+
+
+class TestProcess(unittest.TestCase):
+	@staticmethod
+	def write_inputs(directory):
+		files = {
+			"a.py": "x = 1\n",
+			"b.py": "".join("y{} = {}\n".format(i, i) for i in range(40)),
+			"c.py": "print(z)\n",
+			"d.py": "def f(a):\n\treturn a * 2\nprint(f(3))\n",
+		}
+		for name, code in files.items():
+			with open(os.path.join(directory, name), "w") as file:
+				file.write(code)
+	
+	@staticmethod
+	def run_process(input, output, **options):
+		stdout = io.StringIO()
+		with contextlib.redirect_stdout(stdout):
+			process(input, output, **options)
+		results = {}
+		for name in sorted(os.listdir(output)):
+			if not name.endswith((".lua", ".lines", ".map")):
+				continue
+			with open(os.path.join(output, name)) as file:
+				results[name] = file.read()
+		return stdout.getvalue().replace(output, "<output>"), results
+	
+	def test_parallel_process(self):
+		with tempfile.TemporaryDirectory() as directory:
+			input = os.path.join(directory, "input")
+			os.mkdir(input)
+			self.write_inputs(input)
+			report, results = self.run_process(input, os.path.join(directory, "serial"))
+			self.assertEqual(sorted(results), ["a.lua", "b.lua", "d.lua"])
+			self.assertIn("Processing file: c.py\nStatus: ERROR", report)
+			self.assertEqual(self.run_process(input, os.path.join(directory, "parallel"), jobs=3), (report, results))
+	
+	def test_process_file(self):
+		with tempfile.TemporaryDirectory() as directory:
+			self.write_inputs(directory)
+			_, results = self.run_process(os.path.join(directory, "d.py"), os.path.join(directory, "out"))
+			self.assertEqual(results, {"d.lua": translate("def f(a):\n\treturn a * 2\nprint(f(3))\n")})
+	
+	def test_incremental_process(self):
+		with tempfile.TemporaryDirectory() as directory:
+			input, output = os.path.join(directory, "input"), os.path.join(directory, "output")
+			os.mkdir(input)
+			self.write_inputs(input)
+			_, results = self.run_process(input, output)
+			report, _ = self.run_process(input, output)
+			self.assertEqual(report.count("Status: UP TO DATE"), 3)
+			self.assertIn("Processing file: c.py\nStatus: ERROR", report)
+			with open(os.path.join(input, "a.py"), "w") as file:
+				file.write("x = 2\n")
+			os.remove(os.path.join(input, "d.py"))
+			report, changed = self.run_process(input, output)
+			self.assertEqual(report.count("Status: UP TO DATE"), 1)
+			self.assertEqual(changed, {"a.lua": "x = 2", "b.lua": results["b.lua"]})
+			report, changed = self.run_process(input, output, compact=True)
+			self.assertEqual(report.count("Status: UP TO DATE"), 0)
+			self.assertEqual(sorted(changed), ["a.lua", "a.lua.lines", "b.lua", "b.lua.lines"])
+			_, changed = self.run_process(input, output)
+			self.assertEqual(changed, {"a.lua": "x = 2", "b.lua": results["b.lua"]})
+			# translation of a single file keeps outputs of the other files
+			report, changed = self.run_process(os.path.join(input, "a.py"), output)
+			self.assertIn("Status: UP TO DATE", report)
+			self.assertEqual(sorted(changed), ["a.lua", "b.lua"])
+			# outputs of another version of the translator's sources are rebuilt
+			with mock.patch("lupy.sources_hash", return_value="changed"):
+				report, _ = self.run_process(input, output)
+			self.assertEqual(report.count("Status: UP TO DATE"), 0)
+	
+	def test_process_errors(self):
+		with tempfile.TemporaryDirectory() as directory:
+			input, output = os.path.join(directory, "input"), os.path.join(directory, "output")
+			os.makedirs(os.path.join(input, "sub"))
+			self.write_inputs(input)
+			with open(os.path.join(input, "sub", "a.py"), "w") as file:
+				file.write("x = 3\n")
+			report, results = self.run_process(input, output)
+			self.assertNotIn("a.lua", results)
+			self.assertEqual(report.count("Description: Output a.lua is written by several files"), 2)
+			# failed translation isn't repeated until the file is changed
+			with mock.patch("lupy.process_file") as process_file:
+				report, _ = self.run_process(input, output)
+			self.assertEqual(process_file.call_count, 0)
+			self.assertIn("Processing file: c.py\nStatus: ERROR\nDescription: Semantic Error", report)
+			os.remove(os.path.join(input, "sub", "a.py"))
+			report, results = self.run_process(input, output)
+			self.assertEqual(results["a.lua"], "x = 1")
+			self.assertEqual(report.count("Status: SUCCESS"), 1)
+	
+	def test_atomic_open(self):
+		with tempfile.TemporaryDirectory() as directory:
+			filename = os.path.join(directory, "a.lua")
+			with self.assertRaises(ValueError):
+				with atomic_open(filename) as file:
+					file.write("x = 1")
+					os.remove(file.name)
+					raise ValueError()
+			with self.assertRaises(FileNotFoundError) as context:
+				with atomic_open(os.path.join(directory, "missing", "a.lua")):
+					pass
+			self.assertIsNone(context.exception.__context__)
+			self.assertEqual(os.listdir(directory), [])
+	
+	def test_watch(self):
+		with tempfile.TemporaryDirectory() as directory:
+			input, output = os.path.join(directory, "input"), os.path.join(directory, "output")
+			os.mkdir(input)
+			self.write_inputs(input)
+			stop = threading.Event()
+			stdout = io.StringIO()
+			with contextlib.redirect_stdout(stdout):
+				watcher = threading.Thread(target=watch, args=(input, output), kwargs={"interval": 0.05, "stop": stop})
+				watcher.start()
+				try:
+					lua_path = os.path.join(output, "a.lua")
+					for _ in range(100):
+						if "Watching" in stdout.getvalue():
+							break
+						time.sleep(0.05)
+					with open(os.path.join(input, "a.py"), "w") as file:
+						file.write("x = 3\n")
+					os.remove(os.path.join(input, "d.py"))
+					for _ in range(100):
+						with open(lua_path) as file:
+							if file.read() == "x = 3":
+								break
+						time.sleep(0.05)
+				finally:
+					stop.set()
+					watcher.join()
+			changes = stdout.getvalue().split("Watching")[1]
+			self.assertIn("Processing file: a.py\nStatus: SUCCESS", changes)
+			self.assertNotIn("b.py", changes)
+			self.assertEqual(sorted(name for name in os.listdir(output) if name != MANIFEST), ["a.lua", "b.lua"])
+			with open(lua_path) as file:
+				self.assertEqual(file.read(), "x = 3")
+	
+	def test_daemon(self):
+		with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(2) as executor:
+			self.write_inputs(directory)
+			path = os.path.join(directory, "lupy.sock")
+			server = daemon.SocketServer(path, executor)
+			serving = threading.Thread(target=server.serve_forever)
+			serving.start()
+			try:
+				output = os.path.join(directory, "out")
+				responses = client.request([
+					{"code": "x = 1 + 2\n", "optimize": True, "options": {"compact": True}},
+					{"code": "print(y)\n"},
+					{"input": os.path.join(directory, "d.py"), "output": output},
+					{"input": os.path.join(directory, "a.py"), "output": output},
+				], path)
+			finally:
+				server.shutdown()
+				server.server_close()
+				serving.join()
+		self.assertEqual([response["id"] for response in responses], [0, 1, 2, 3])
+		self.assertEqual(responses[0]["lua"], "x=3")
+		self.assertTrue(responses[1]["error"].startswith("SemanticError"))
+		self.assertIn("Processing file: d.py\nStatus: SUCCESS", responses[2]["report"])
+		self.assertTrue(all(response["total"] >= response.get("time", 0) for response in responses))
+	
+	def test_daemon_builds_of_same_output(self):
+		running = []
+		overlaps = []
+		execute = daemon.execute
+		
+		def slow_execute(request):
+			running.append(request["output"])
+			overlaps.append(running.count(request["output"]))
+			time.sleep(0.05)
+			running.remove(request["output"])
+			return execute(request)
+		
+		with tempfile.TemporaryDirectory() as directory, ThreadPoolExecutor(4) as executor:
+			self.write_inputs(directory)
+			output = os.path.join(directory, "out")
+			requests = "".join(json.dumps({"id": name, "input": os.path.join(directory, name), "output": output}) + "\n"
+							   for name in ("a.py", "b.py", "d.py"))
+			writer = io.StringIO()
+			with mock.patch("daemon.execute", slow_execute):
+				daemon.serve_stream(io.StringIO(requests), writer, executor)
+			with open(os.path.join(output, MANIFEST)) as file:
+				manifest = json.load(file)["files"]
+		self.assertEqual(overlaps, [1, 1, 1])
+		self.assertEqual(len(writer.getvalue().splitlines()), 3)
+		self.assertEqual(sorted(os.path.basename(path) for path in manifest), ["a.py", "b.py", "d.py"])
+	
+	def test_translate_async(self):
+		codes = {"a": "x = 1 + 2\n", "b": "print(y)\n", "c": "def f(a):\n\treturn a\nprint(f(1))\n"}
+		
+		async def collect(**arguments):
+			return [result async for result in translate_many(codes.items(), limit=2, **arguments)]
+		
+		results = dict(asyncio.run(collect(optimize=True)))
+		self.assertEqual(results["a"], translate(codes["a"], optimize=True))
+		self.assertEqual(results["c"], translate(codes["c"], optimize=True))
+		self.assertIsInstance(results["b"], SemanticError)
+		timed_out = dict(asyncio.run(collect(timeout=0)))
+		self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in timed_out.values()))
+		self.assertEqual(asyncio.run(translate_async("x = [1]\n", compact=True)), "x={[0]=1}")
+	
+	def test_concurrent_translation(self):
+		translators = [Translator(), Translator(optimize=True, compact=True), Translator(local_variables=True, source_map=True)]
+		codes = ["x{} = {} + 1\n".format(i, i) for i in range(60)] + [
+			"def f(a):\n\treturn a * 2\nprint(f(3))\n",
+			"s = 'a'\nfor i in range(3):\n\ts = s + 'b'\n",
+			"print(y)\n",
+		]
+		tasks = [(translator, code) for translator in translators for code in codes] * 6
+		
+		def run(task):
+			try:
+				return task[0].translate(task[1])
+			except SemanticError as e:
+				return str(e)
+		
+		expected = [run(task) for task in tasks]
+		interval = sys.getswitchinterval()
+		# threads are switched as often as possible, so any state shared by translations would be mixed up
+		sys.setswitchinterval(1e-6)
+		try:
+			with ThreadPoolExecutor(32) as executor:
+				results = list(executor.map(run, tasks))
+		finally:
+			sys.setswitchinterval(interval)
+		self.assertGreater(len(tasks), 1000)
+		self.assertEqual(results, expected)
+		results = translators[1].translate_all(codes, jobs=8)
+		self.assertEqual(results[:-1], [translators[1].translate(code) for code in codes[:-1]])
+		self.assertIsInstance(results[-1], SemanticError)
+	
+	def test_profile(self):
+		profile = Profile()
+		code = "def f(a):\n\treturn a * 2\nprint(f(3))\n"
+		self.assertEqual(translate(code, profile=profile, optimize=True), translate(code))
+		self.assertEqual(list(profile.phases), ["lexing", "recognition", "tree", "semantics", "optimization", "generation"])
+		self.assertEqual(profile.counters["tokens"], len(analyzer.parse(code)))
+		self.assertEqual(profile.counters["lines"], len(translate(code).split("\n")))
+		self.assertGreater(profile.counters["states"], profile.counters["nodes"])
+		with tempfile.TemporaryDirectory() as directory:
+			input, output = os.path.join(directory, "input"), os.path.join(directory, "output")
+			os.mkdir(input)
+			self.write_inputs(input)
+			self.run_process(input, output)
+			report, _ = self.run_process(input, output, profile=True, pstats=1)
+			self.assertNotIn("UP TO DATE", report)
+			with open(os.path.join(output, PROFILE)) as file:
+				records = json.load(file)
+			self.assertEqual(sorted(records["files"]), ["a.py", "b.py", "d.py"])
+			self.assertEqual(records["total"]["counters"]["tokens"],
+							 sum(record["counters"]["tokens"] for record in records["files"].values()))
+			self.assertIn("b.py", report.split("Profile (ms):")[1])
+			self.assertIn("b.recognition.pstats", os.listdir(os.path.join(output, "profile")))
+
+
+class TestCache(unittest.TestCase):
+	def test_cached_translation(self):
+		cache = TranslationCache()
+		code = "x = 1\nprint(x)\n"
+		lua = translate(code, cache=cache)
+		self.assertEqual(translate(code, cache=cache), lua)
+		self.assertEqual(Translator(cache=cache).translate(code), lua)
+		out = io.StringIO()
+		translate(code, out=out, cache=cache)
+		self.assertEqual(out.getvalue(), lua)
+		self.assertEqual((cache.stats()["hits"], cache.stats()["misses"]), (3, 1))
+		# options and code are parts of the key
+		self.assertEqual(translate(code, cache=cache, compact=True), translate(code, compact=True))
+		translate("x = 2\n", cache=cache)
+		self.assertEqual(len(cache), 3)
+		
+		for _ in range(2):
+			with self.assertRaises(SemanticError):
+				translate("print(y)\n", cache=cache)
+		self.assertEqual(cache.stats()["misses"], 4)
+		translate("print(y)\n", safe=False, cache=cache)
+		
+		cache = TranslationCache(errors=False)
+		for _ in range(2):
+			with self.assertRaises(SyntacticError):
+				translate("x = = 1\n", cache=cache)
+		self.assertEqual(len(cache), 0)
+	
+	def test_eviction(self):
+		now = [0.0]
+		cache = TranslationCache(max_bytes=1700, ttl=10, clock=lambda: now[0])
+		for i in range(4):
+			cache.put(cache.key(str(i), ""), "x" * 150)
+		self.assertEqual(cache.get(cache.key("0", "")), (True, "x" * 150))
+		cache.put(cache.key("4", ""), "x" * 150)
+		# least recently used entry is evicted first
+		self.assertFalse(cache.get(cache.key("1", ""))[0])
+		self.assertTrue(cache.get(cache.key("0", ""))[0])
+		self.assertLessEqual(cache.size, 1700)
+		cache.put(cache.key("big", ""), "x" * 2000)
+		self.assertFalse(cache.get(cache.key("big", ""))[0])
+		now[0] = 11
+		self.assertFalse(cache.get(cache.key("0", ""))[0])
+		stats = cache.stats()
+		self.assertEqual((stats["evictions"], stats["expirations"], stats["entries"]), (1, 1, 3))
+
+
+class TestBenchmarks(unittest.TestCase):
+	def test_synthetic_programs(self):
+		for parameters in [{}, {"depth": 3, "expression": 6, "density": 0.9}, {"depth": 0, "literal": 8, "density": 0}]:
+			for seed in range(3):
+				code = ProgramGenerator(statements=12, seed=seed, **parameters).generate()
+				self.assertEqual(code, ProgramGenerator(statements=12, seed=seed, **parameters).generate())
+				translate(code)
+		small = analyzer.parse(ProgramGenerator(statements=10).generate())
+		self.assertGreater(len(analyzer.parse(ProgramGenerator(statements=40).generate())), 2 * len(small))
+	
+	def test_scaling_regressions(self):
+		self.assertAlmostEqual(fit_exponent([10, 100, 1000], [2.0, 200.0, 20000.0]), 2.0)
+		baseline = {"stages": {"Generator.generate": {"throughput": 1000.0, "exponent": 1.0}}}
+		results = {"stages": {"Generator.generate": {"throughput": 800.0, "exponent": 1.2}}}
+		self.assertEqual(regressions(results, baseline, 0.3, 0.25), [])
+		results["stages"]["Generator.generate"] = {"throughput": 600.0, "exponent": 1.5}
+		self.assertEqual(len(regressions(results, baseline, 0.3, 0.25)), 2)
+	
+	def test_memory(self):
+		code = ProgramGenerator(statements=4).generate()
+		result = measure(code, sites=2, optimize=True)
+		phases = result["phases"]
+		self.assertEqual(list(phases), ["lexing", "recognition", "tree", "semantics", "optimization", "generation"])
+		self.assertEqual(phases["lexing"]["objects"]["Token"], result["counters"]["tokens"])
+		self.assertEqual(phases["recognition"]["objects"]["EarleyState"], result["counters"]["states"])
+		self.assertEqual(phases["recognition"]["objects"]["ChartEntry"], result["counters"]["tokens"] + 1)
+		self.assertGreater(phases["tree"]["objects"]["SyntaxTree"], 0)
+		# chart isn't needed after the tree is built
+		self.assertEqual(phases["generation"]["objects"]["EarleyState"], 0)
+		self.assertGreaterEqual(result["peak"], phases["recognition"]["peak"])
+		self.assertLessEqual(len(phases["recognition"]["sites"]), 2)
+		site = phases["recognition"]["sites"][0]["site"].rsplit(":", 1)[0]
+		self.assertEqual(os.path.abspath(site), os.path.abspath(parse.__file__))
+		self.assertEqual(over_budget({"4": result}, {"recognition": 10 ** 6}), [])
+		self.assertEqual(len(over_budget({"4": result}, {"recognition": 1})), 1)
 
 if __name__ == '__main__':
 	unittest.main()
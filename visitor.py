@@ -0,0 +1,40 @@
+import sys
+
+
+def visits(*labels):
+	"""Marks method as a handler of tree nodes with given labels."""
+	def register(method):
+		method.labels = labels
+		return method
+	return register
+
+
+class Visitor:
+	"""
+	Base class for tree walkers.
+	Methods marked with `visits` are collected into `dispatch_table` once per class,
+	so any node is dispatched with a single lookup by its (interned) label.
+	Subclasses inherit handlers of their parents and can override them, with `visits` or just by name.
+	"""
+	# names of handlers by label, and handlers of the class resolved from them
+	dispatch_names = {}
+	dispatch_table = {}
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		names = dict(cls.dispatch_names)
+		for name, attribute in vars(cls).items():
+			for label in getattr(attribute, "labels", ()):
+				names[sys.intern(label)] = name
+		cls.dispatch_names = names
+		cls.dispatch_table = {label: getattr(cls, name) for label, name in names.items()}
+
+	def visit(self, node, label=None):
+		"""Calls handler registered for the label of the node, or for `label` if it's given."""
+		handler = self.dispatch_table.get(node.label() if label is None else label)
+		if handler is None:
+			return self.visit_default(node)
+		return handler(self, node)
+
+	def visit_default(self, node):
+		raise KeyError("No handler registered for {}".format(node.label()))